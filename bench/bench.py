@@ -0,0 +1,226 @@
+"""Benchmarks for the formatter.
+
+Times the public functions on the synthetic SQL in corpus.py,
+and writes the results out as JSON so runs on different commits can be compared:
+
+    python bench/bench.py --output before.json
+    (make changes)
+    python bench/bench.py --output after.json --compare before.json
+
+With --versus, parse is also run side by side with another implementation
+(like the original src/brown_v0.py) on the same SQL, to see what the rewrite
+and new features cost, and where the output changed:
+
+    python bench/bench.py --versus brown_v0
+"""
+
+import contextlib
+import difflib
+import importlib
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import click
+from corpus import SCENARIOS
+
+# run against the working tree, not whatever brown might be installed
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+import brown  # noqa: E402
+from brown.lexer import tokenize  # noqa: E402
+
+
+def best_time(f, repeat: int) -> float:
+    """Fastest of `repeat` calls to f, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def get_cases(sql: str) -> dict:
+    """What to call for each function on one scenario:
+    {function name: (zero argument callable, input size in bytes)}.
+    Functions that don't apply to the scenario are left out."""
+    cases = {
+        "tokenize": (lambda: tokenize(sql), len(sql.encode())),
+        "parse": (lambda: brown.format_str(sql), len(sql.encode())),
+    }
+
+    tokens = tokenize(sql)
+    clauses = brown.build_statement(tokens).clauses
+    if (select := [x for x in clauses if x.keyword == "SELECT"]) and ";" not in sql:
+        clause = select[0]
+        # the first and last token of the SELECT body
+        span = [
+            i
+            for x in clause.items
+            for i in ((x.token,) if isinstance(x, brown.Comment) else (x.start, x.end - 1))
+        ]
+        cases["process_select"] = (
+            lambda: brown.pretty(brown.process_select(tokens, clause, " " * 4), 100),
+            tokens[max(span)].end - tokens[min(span)].start,
+        )
+
+        if case := [x for x in clause.items if isinstance(x, brown.Case)]:
+            case = case[0]
+            cases["process_case"] = (
+                lambda: brown.pretty(brown.process_case(tokens, case, " " * 4), 100, " " * 4, 4),
+                tokens[case.end - 1].end - tokens[case.start].start,
+            )
+
+    # the scan stops at the matching close, so its size is what it reads up to there
+    if (start := sql.find("(")) > -1:
+        after = sql[start + 1 :]
+        cases["scan_to_close"] = (
+            lambda: brown.scan_to_close(after),
+            len(brown.scan_to_close(after).encode()) + len(")"),
+        )
+    elif (start := sql.find("{{")) > -1:
+        after = sql[start + 2 :]
+        cases["scan_to_close"] = (
+            lambda: brown.scan_to_close(after, open_char="{{", close_char="}}"),
+            len(brown.scan_to_close(after, open_char="{{", close_char="}}").encode()) + len("}}"),
+        )
+    return cases
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scale: float, repeat: int, only: tuple) -> dict:
+    results = []
+    for scenario, (generate, n) in SCENARIOS.items():
+        if only and scenario not in only:
+            continue
+        sql = generate(max(1, int(n * scale)))
+        statements = max(1, sql.count(";"))
+        for function, (f, size) in get_cases(sql).items():
+            seconds = best_time(f, repeat)
+            results.append(
+                {
+                    "scenario": scenario,
+                    "function": function,
+                    "bytes": size,
+                    "statements": statements,
+                    "seconds": seconds,
+                    "mb_per_s": size / 1e6 / seconds,
+                    "statements_per_s": statements / seconds,
+                }
+            )
+            click.echo(
+                f"{scenario:>20} {function:>22} {seconds * 1000:10.2f} ms "
+                + f"{size / 1e6 / seconds:8.2f} MB/s {statements / seconds:10.1f} stmt/s",
+                err=True,
+            )
+    return {
+        "brown_version": brown.__version__,
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "scale": scale,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def run_versus(module: str, scale: float, repeat: int, only: tuple) -> list:
+    """Time brown.parse against `module`.parse on every scenario,
+    and check whether they agree on the output."""
+    other = importlib.import_module(module)
+    results = []
+    for scenario, (generate, n) in SCENARIOS.items():
+        if only and scenario not in only:
+            continue
+        sql = generate(max(1, int(n * scale)))
+        result = {"scenario": scenario, "bytes": len(sql.encode())}
+        outputs = {}
+        for name, parse in [("brown", brown.parse), (module, other.parse)]:
+            try:
+                # the old versions like to print
+                with contextlib.redirect_stdout(io.StringIO()):
+                    outputs[name] = parse(sql, debug=False)
+                    result[f"{name}_seconds"] = best_time(lambda: parse(sql, debug=False), repeat)
+            except Exception as e:
+                outputs[name] = None
+                result[f"{name}_seconds"] = None
+                result[f"{name}_error"] = f"{type(e).__name__}: {e}"
+        if result["brown_seconds"] is not None and result[f"{module}_seconds"] is not None:
+            result["ratio"] = result["brown_seconds"] / result[f"{module}_seconds"]
+        else:
+            result["ratio"] = None
+        if outputs["brown"] is not None and outputs[module] is not None:
+            diff = list(
+                difflib.unified_diff(
+                    outputs[module].splitlines(), outputs["brown"].splitlines(), lineterm="", n=0
+                )
+            )
+            result["same_output"] = len(diff) == 0
+            result["lines_changed"] = len([x for x in diff[2:] if x[:1] in "+-"])
+            result["diff"] = "\n".join(diff[:20])
+        results.append(result)
+        click.echo(
+            f"{scenario:>20} "
+            + (f"{result['ratio']:8.2f}x" if result["ratio"] is not None else "   error ")
+            + f" same output: {result.get('same_output')}"
+            + f" ({result.get('lines_changed', 0)} lines differ)",
+            err=True,
+        )
+    return results
+
+
+def compare(new: dict, old: dict) -> None:
+    """Print how long each benchmark took compared to a previous run."""
+    old_times = {(x["scenario"], x["function"]): x["seconds"] for x in old["results"]}
+    click.echo(f"compared to {old.get('commit')} (ratio > 1 is slower):", err=True)
+    for x in new["results"]:
+        if (key := (x["scenario"], x["function"])) in old_times:
+            click.echo(
+                f"{x['scenario']:>20} {x['function']:>22} {x['seconds'] / old_times[key]:8.2f}x",
+                err=True,
+            )
+
+
+@click.command()
+@click.option("--scale", default=1.0, help="Multiply the size of every scenario by this.")
+@click.option("--repeat", default=5, help="Time each function this many times, keep the best.")
+@click.option("--scenario", "only", multiple=True, help="Only run these scenarios.")
+@click.option("--output", type=click.Path(), help="Write the results here (default: stdout).")
+@click.option("--compare", "baseline", type=click.Path(exists=True), help="A previous --output.")
+@click.option(
+    "--versus",
+    metavar="MODULE",
+    help="Also time parse against MODULE.parse (e.g. brown_v0) and compare their output.",
+)
+def main(scale: float, repeat: int, only: tuple, output: str, baseline: str, versus: str):
+    results = run(scale, repeat, only)
+    if versus is not None:
+        click.echo(f"brown vs. {versus} (ratio > 1 is slower):", err=True)
+        results["versus"] = {"module": versus, "results": run_versus(versus, scale, repeat, only)}
+    if output is None:
+        click.echo(json.dumps(results, indent=2))
+    else:
+        Path(output).write_text(json.dumps(results, indent=2) + "\n")
+    if baseline is not None:
+        compare(results, json.loads(Path(baseline).read_text()))
+
+
+if __name__ == "__main__":
+    main()
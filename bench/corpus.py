@@ -0,0 +1,76 @@
+"""Synthetic SQL for benchmarking.
+
+Each generator takes a size `n` and returns one statement (no trailing ;)
+that stresses one part of the formatter.
+Output is deterministic, so timings are comparable across commits.
+"""
+
+
+def wide_select(n: int) -> str:
+    """A SELECT with n columns, some of them expressions."""
+    columns = [
+        f"col_{i}" if i % 3 else f"coalesce(col_{i}, other_{i}, 0) as col_{i}" for i in range(n)
+    ]
+    return "select " + ", ".join(columns) + " from wide_table w where w.id > 10 and w.ok"
+
+
+def nested_subqueries(n: int) -> str:
+    """A FROM clause with subqueries nested n deep."""
+    sql = "base_table"
+    for i in range(n):
+        sql = f"(select a, b, c from {sql} q{i} where a > {i})"
+    return f"select a, b, c from {sql} top_level where b is not null"
+
+
+def case_chain(n: int) -> str:
+    """A CASE with n branches, like the mapping tables we generate."""
+    whens = " ".join([f"when code = {i} then 'label_{i}'" for i in range(n)])
+    return f"select id, case {whens} else null end as label from codes"
+
+
+def commented(n: int) -> str:
+    """n columns, every one with a trailing comment and every few with a comment line above."""
+    lines = ["-- a header comment", "select"]
+    for i in range(n):
+        if i % 4 == 0:
+            lines.append(f"    -- group {i // 4}, the next few columns, please keep")
+        lines.append(f"    col_{i},  -- column {i}, described in detail")
+    lines.append("    last_col")
+    lines.append("-- closing comment")
+    lines.append("from commented_table c  -- table comment")
+    lines.append("where c.x and c.y > 0")
+    return "\n".join(lines)
+
+
+def jinja(n: int) -> str:
+    """A dbt-style model with n templated columns and a templated FROM."""
+    columns = [
+        f"{{{{ dbt_utils.safe_cast('col_{i}', api.Column.translate_type('int')) }}}} as c{i}"
+        for i in range(n)
+    ]
+    return (
+        "select "
+        + ", ".join(columns)
+        + " from {{ ref('upstream_model') }} u where {{ var('flag') }} and u.id > 0"
+    )
+
+
+def script(n: int) -> str:
+    """n small statements separated by ;"""
+    return "".join(
+        [
+            f"select a{i}, b{i}, c from t{i} where x = {i} and y in (1, 2, 3);  -- statement {i}\n"
+            for i in range(n)
+        ]
+    )
+
+
+# name: (generator, n at scale 1)
+SCENARIOS = {
+    "wide_select": (wide_select, 2000),
+    "nested_subqueries": (nested_subqueries, 50),
+    "case_chain": (case_chain, 500),
+    "commented": (commented, 1000),
+    "jinja": (jinja, 500),
+    "script": (script, 1000),
+}
@@ -0,0 +1,898 @@
+# [Get all possible keywords](https://www.vertica.com/docs/12.0.x/HTML/Content/Authoring/SQLReferenceManual/SystemTables/CATALOG/KEYWORDS.htm)
+# KEYWORDS = "SELECT keyword FROM keywords WHERE reserved = 'R' ;"
+#
+# [CTE structure](https://www.vertica.com/docs/12.0.x/HTML/Content/Authoring/SQLReferenceManual/Statements/SELECT/WITHClause.htm)
+# WITH... with-query-1 [(col-name[,…])]AS (SELECT…),
+#     with-query-2 [(col-name[,…])]AS (SELECT… [with-query-1]),
+# .
+# .
+# .
+#     with-query-n [(col-name[,…])]AS (SELECT… [with-query-1, with-query-2, with-query-n[,…]])
+#
+# [Select statement structure](https://www.vertica.com/docs/12.0.x/HTML/Content/Authoring/SQLReferenceManual/Statements/SELECT/SELECT.htm)
+# [ AT epoch ] SELECT [ /*+ LABEL(label‑name)*/ ] [ ALL | DISTINCT ]
+# ... { * | expression [ [AS] output-name] }[,…]
+# ... [ into-table-clause ]
+# ... [ from-clause ]
+# ... [ where‑clause ]
+# ... [ time‑series‑clause ]
+# ... [ group‑by‑clause[,…] ]
+# ... [ having-clause[,…] ]
+# ... [ match-clause ]
+# ... [ UNION { ALL | DISTINCT } ]
+# ... [ except‑clause ]
+# ... [ intersect‑clause ]
+# ... [ ORDER BY expression { ASC | DESC }[,…] ]
+# ... [ LIMIT { count | ALL } ]
+# ... [ OFFSET start‑row ]
+# ... [ FOR UPDATE [ OF table-name[,…] ] ]
+
+import re
+from collections import OrderedDict, deque, namedtuple
+from collections.abc import Iterable, Iterator
+from itertools import chain
+from time import perf_counter
+
+from . import profiling
+from .layout import BREAK_PARENT, HARDLINE, LINE, Dedent, Group, LineSuffix, Nest, join, pretty
+from .lexer import Token, iter_statements, split_script, tokenize
+from .tree import (  # noqa: F401
+    JOIN_STARTS,
+    ORDERED_GROUPS,
+    Case,
+    CaseBranch,
+    Clause,
+    Comment,
+    Expression,
+    Statement,
+    Subquery,
+    build_expression,
+    build_statement,
+)
+
+__version__ = "0.1.0"
+
+# the words we upper case inside of a CASE
+CASE_KEYWORDS = frozenset(("CASE", "WHEN", "THEN", "ELSE", "END", "AS", "NULL", "IN"))
+
+# Generated SQL repeats the same subqueries over and over (within a file and across files),
+# so we remember how we formatted the last this many of them
+SUBQUERY_CACHE_SIZE = 4096
+
+# and the layouts of the last this many CASE expressions
+EXPRESSION_CACHE_SIZE = 4096
+
+# Formatting the statements of a script in parallel only pays off
+# past this many characters of SQL (a few thousand lines)
+PARALLEL_MIN_SIZE = 256 * 1024
+# and the statements are sent to the workers in batches of about this size
+PARALLEL_BATCH_SIZE = 32 * 1024
+
+# Tracing of what the formatter is doing goes to the "brown" logger, at DEBUG level.
+# It's only ever called behind `if debug:`,
+# so with debug off (the default) we don't even build the messages
+# (or import logging).
+# Attach a handler to that logger to hook into the events.
+
+
+def trace(message: str, *args) -> None:
+    import logging
+
+    logging.getLogger(__name__).debug(message, *args, stacklevel=2)
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class LayoutCache:
+    """Layouts we've already worked out, so we don't work them out again:
+    a dict that drops the least recently used entries past `maxsize`.
+    Hits and misses are counted, to see how big it needs to be.
+    Like functools.lru_cache, there's cache_info() and cache_clear()."""
+
+    __slots__ = ("maxsize", "entries", "hits", "misses")
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """The layout for key, or None if we don't have it."""
+        layout = self.entries.get(key)
+        if layout is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return layout
+
+    def put(self, key, layout) -> None:
+        self.entries[key] = layout
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.entries))
+
+    def cache_clear(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# The layouts of CASE expressions, shared by everything formatted in this process
+# (so across all the files of a run): dbt projects repeat the same CASE mappings in model
+# after model. See layout_case.
+expression_cache = LayoutCache(EXPRESSION_CACHE_SIZE)
+
+# And the same for subqueries, see layout_subquery.
+subquery_cache = LayoutCache(SUBQUERY_CACHE_SIZE)
+
+
+def comment_text(token: Token) -> str:
+    """The body of a line comment, without the leading -- and spacing."""
+    return token.text[2:].strip()
+
+
+def get_comment(tokens: list, comment: Comment) -> str:
+    """The body of a Comment node, or None if there isn't one."""
+    if comment is None:
+        return None
+    return comment_text(tokens[comment.token])
+
+
+def render_token(token: Token, upper: frozenset = frozenset()) -> str:
+    if token.kind == "comment":
+        return ("-- " + comment_text(token)).strip()
+    if token.kind == "template" and token.text[:2] == "{{":
+        return "{{ " + re.sub(r"\s+", " ", token.text[2:-2].strip()) + " }}"
+    if token.kind == "keyword" and token.text.upper() in upper:
+        return token.text.upper()
+    return token.text
+
+
+def separator(previous: Token, token: Token) -> str:
+    """What goes between two tokens when we put them back together.
+
+    Wherever the source had whitespace we put a single space,
+    except just inside of parentheses, where we put nothing.
+    A line comment always ends its line, otherwise it would eat what follows,
+    and one that was on its own line in the source starts a new one.
+    """
+    if previous.kind == "comment" or (token.kind == "comment" and token.newlines > 0):
+        return "\n"
+    if token.start > previous.end and previous.kind != "open" and token.kind != "close":
+        return " "
+    return ""
+
+
+def render(tokens: list, start: int = 0, end: int = None, upper: frozenset = frozenset()) -> str:
+    """Put tokens[start:end] back together as text (see `separator`).
+    Keywords in `upper` are upper cased."""
+    if end is None:
+        end = len(tokens)
+    parts = []
+    previous = None
+    for i in range(start, end):
+        token = tokens[i]
+        if previous is not None:
+            parts.append(separator(previous, token))
+        parts.append(render_token(token, upper))
+        previous = token
+    return "".join(parts)
+
+
+def text_doc(text: str) -> list:
+    """A document for text that may have line breaks in it (after comments)."""
+    if "\n" not in text:
+        return text
+    return join(HARDLINE, text.split("\n"))
+
+
+def trailing_comment_doc(tokens: list, comment: Comment) -> list:
+    """A document for the comment at the end of a line, if there is one."""
+    if comment is None:
+        return []
+    return [LineSuffix(format_trailing_comment(get_comment(tokens, comment)))]
+
+
+def process_from(
+    tokens: list, clause: Clause, indent: str, line_length: int = 100, starting_indent: str = ""
+) -> Group:
+    """FROM, joins, and everything else:
+    on the line with the keyword if it fits, otherwise on the next line, indented.
+    Comments go at the end of the keyword's line.
+    A body with subqueries in it always starts on the keyword's line,
+    since the subqueries get lines of their own anyway,
+    and then the comments go at the end of its last line (after the subqueries, not in them)."""
+    comments = trailing_comment_doc(tokens, clause.comment)
+    if len(clause.items) == 0:
+        return Group([clause.keyword] + comments)
+    expression = clause.items[0]
+    comments += trailing_comment_doc(tokens, expression.comment)
+    if any(isinstance(x, Subquery) for x in expression.children):
+        body = process_expression(tokens, expression, indent, line_length, starting_indent)
+        return Group([clause.keyword, " ", body] + comments)
+    return Group(
+        [clause.keyword]
+        + comments
+        + [Nest(indent, [LINE, text_doc(render(tokens, expression.start, expression.end))])]
+    )
+
+
+def process_where(
+    tokens: list, clause: Clause, indent: str, line_length: int = 100, starting_indent: str = ""
+) -> Group:
+    """The conditions on the WHERE line, joined by AND, if they fit
+    (and only the last one has a comment, since it'd end up at the end of the line,
+    and there are no comments on their own lines),
+    otherwise one per line, indented."""
+    doc = [clause.keyword] + trailing_comment_doc(tokens, clause.comment)
+    lines = []
+    conditions = 0
+    for n, item in enumerate(clause.items):
+        if isinstance(item, Comment):
+            # a comment on its own line, breaking up the group
+            lines += [LINE, "-- " + get_comment(tokens, item), BREAK_PARENT]
+            continue
+        lines += [LINE, "AND "] if conditions > 0 else [LINE]
+        # where the condition starts, if the conditions go on lines of their own
+        column = len(starting_indent + indent) + (len("AND ") if conditions > 0 else 0)
+        conditions += 1
+        lines.append(
+            process_expression(
+                tokens, item, indent, line_length, starting_indent + indent, column=column
+            )
+        )
+        lines += trailing_comment_doc(tokens, item.comment)
+        if item.comment is not None and n < len(clause.items) - 1:
+            # on one line, the comment would comment out the conditions after it
+            lines.append(BREAK_PARENT)
+    if len(lines) > 0:
+        doc.append(Nest(indent, lines))
+    return Group(doc)
+
+
+def scan_to_close(
+    remaining_text: str,
+    open_char: str = "(",
+    close_char: str = ")",
+    skip_comments: bool = False,
+    debug: bool = False,
+) -> str:
+    needed_to_close: int = 1
+    i: int = 0
+    while needed_to_close > 0 and (i + len(close_char) - 1) < len(remaining_text):
+        if remaining_text[i : i + len(close_char)] == close_char:
+            if debug:
+                trace("Found a close at position i=%d", i)
+            needed_to_close -= 1
+            # if we have a longer close char, skip the whole thing
+            i += len(close_char) - 1
+        if remaining_text[i : i + len(open_char)] == open_char:
+            if debug:
+                trace("Found another open at position i=%d", i)
+            needed_to_close += 1
+            i += len(open_char) - 1
+        i += 1
+    if needed_to_close > 0:
+        raise RuntimeError("Unbounded group")
+    return remaining_text[: i - len(close_char)]
+
+
+def detect_substatement_type(substatement: str) -> str:
+    if len(substatement.strip()) > 6 and substatement.strip().upper()[:6] == "SELECT":
+        return "select"
+    # lists of numbers:
+    elif re.match(r"[0-9*\.]+", substatement.strip()) is not None:
+        return "list"
+    # lists of strings:
+    elif re.match(r"'.*?'\s*,", substatement.strip()) is not None:
+        return "list"
+    # everything else:
+    else:
+        return "generic"
+
+
+def process_branch(tokens: list, branch: CaseBranch, indent: str, debug: bool = False) -> list:
+    """A WHEN ... THEN ... (or ELSE ...) of a CASE.
+    It stays on one line, except that a comment in it ends its line
+    (and a comment on its own line in the source starts one),
+    and the lines after that are indented once more.
+    CASEs nested in it are laid out by process_case right where they start."""
+    pieces = []
+    start = branch.start
+    for case in branch.cases + [None]:
+        end = case.start if case is not None else branch.end
+        if end > start:
+            if start > branch.start:
+                pieces.append(separator(tokens[start - 1], tokens[start]))
+            pieces.append(render(tokens, start, end, CASE_KEYWORDS))
+        if case is not None:
+            if debug:
+                trace("found a nested case: %r", case)
+            if case.start > branch.start:
+                pieces.append(separator(tokens[case.start - 1], tokens[case.start]))
+            pieces.append(process_case(tokens, case, indent, debug))
+            start = case.end
+    doc = []
+    for piece in pieces:
+        doc += join(HARDLINE, piece.split("\n")) if type(piece) is str else [piece]
+    # everything after the first line break is indented once more
+    if HARDLINE in doc:
+        k = doc.index(HARDLINE)
+        doc = doc[:k] + [Nest(indent, doc[k:])]
+    return doc
+
+
+def process_case(tokens: list, case: Case, indent: str, debug: bool = False) -> Group:
+    """A Case goes on one line if it fits (and has no comments in it).
+    Otherwise the CASE stays where it is,
+    and each branch (and the END) goes on its own line, indented once more,
+    with the comments between them on their own lines too."""
+    if debug:
+        trace("case=%r", case)
+    lines = []
+    for branch in case.branches:
+        for comment in branch.comments:
+            lines += [LINE, "-- " + get_comment(tokens, comment), BREAK_PARENT]
+        lines += [LINE, process_branch(tokens, branch, indent, debug)]
+        if branch.comment is not None:
+            lines += trailing_comment_doc(tokens, branch.comment) + [BREAK_PARENT]
+    for comment in case.end_comments:
+        lines += [LINE, "-- " + get_comment(tokens, comment), BREAK_PARENT]
+    lines += [LINE, text_doc(render(tokens, case.close, case.end, CASE_KEYWORDS))]
+    head = [text_doc(render(tokens, case.start, case.head, CASE_KEYWORDS))]
+    if case.head_comment is not None:
+        head += trailing_comment_doc(tokens, case.head_comment) + [BREAK_PARENT]
+    return Group(head + [Nest(indent, lines)])
+
+
+def layout_case(
+    tokens: list,
+    case: Case,
+    indent: str,
+    line_length: int = 100,
+    starting_indent: str = "",
+    debug: bool = False,
+    column: int = None,
+) -> str:
+    """The Case laid out by process_case, on a line indented by `starting_indent`,
+    starting `column` characters in (right after the indent, by default).
+    Layouts are kept in `expression_cache`, by the tokens of the Case put back together
+    by render (with the keywords upper cased, like the layout has them),
+    and the options, since that's all the layout depends on."""
+    if column is None:
+        column = len(starting_indent)
+    key = (
+        render(tokens, case.start, case.end, CASE_KEYWORDS),
+        indent,
+        line_length,
+        starting_indent,
+        column,
+    )
+    layout = expression_cache.get(key)
+    if (profile := profiling.active) is not None:
+        profile.count("cases")
+        profile.count("cases cached", layout is not None)
+    if layout is None:
+        doc = process_case(tokens, case, indent, debug)
+        layout = pretty(doc, line_length, starting_indent, column)
+        expression_cache.put(key, layout)
+    return layout
+
+
+def indent_case_statement(
+    stmt: str, cur_ind: str, ind: str, max_ll: int, debug: bool = False
+) -> str:
+    """Format the CASE statement in `stmt` (and whatever follows its END, like an alias),
+    starting on a line indented by `cur_ind`:
+    if it gets broken up, the branches go one `ind` further in."""
+    tokens = tokenize(stmt)
+    if len(tokens) == 0 or tokens[0].text.upper() != "CASE":
+        raise RuntimeError(f"Not a CASE statement: {stmt[:20]!r}")
+    case = build_expression(tokens, 0, len(tokens))
+    layout = layout_case(tokens, case, ind, max_ll, cur_ind, debug)
+    if case.comment is not None:
+        layout += format_trailing_comment(get_comment(tokens, case.comment))
+    return layout
+
+
+def indent_case_statement_iterative(
+    stmt: str, cur_ind: str, ind: str, max_ll: int, debug: bool = False
+) -> str:
+    """The previous version of indent_case_statement used str.replace and split() to break
+    up the WHEN clauses.
+    This approach works for the most simple cases, but gets unworkable with
+    wacky comments, nested statements, and other edge cases.
+    Here, the tokens are read once into a Case (see build_case),
+    which keeps track of the comments and nested CASEs,
+    and process_case lays that out.
+    Unlike indent_case_statement, cur_ind is the indent of the lines inside of the CASE
+    (which are always indented at least once)."""
+    return indent_case_statement(stmt, cur_ind[len(ind) :], ind, max_ll, debug=debug)
+
+
+def layout_subquery(
+    tokens: list,
+    subquery: Subquery,
+    indent: str,
+    line_length: int = 100,
+    starting_indent: str = "",
+    debug: bool = False,
+) -> str:
+    """The statement inside of a Subquery, laid out on lines indented by `starting_indent`
+    (the same text parse would make out of it, but from the tree we already have,
+    so what's inside of a subquery is only ever tokenized and parsed once, however deep it is).
+    The layout is kept on the Subquery, and in `subquery_cache`,
+    by the tokens of the subquery put back together by render and the options,
+    so the same subquery written with different whitespace is only laid out once."""
+    options = (indent, line_length, starting_indent)
+    if subquery.layout is not None and subquery.layout[0] == options:
+        return subquery.layout[1]
+    key = (render(tokens, subquery.open + 1, subquery.close),) + options
+    layout = subquery_cache.get(key)
+    if layout is None:
+        if debug:
+            trace("found a subquery: %r", key[0])
+        doc = layout_statement(
+            tokens, subquery.statement, indent, line_length, starting_indent, debug
+        )
+        layout = starting_indent + pretty(doc, line_length, starting_indent, len(starting_indent))
+        subquery_cache.put(key, layout)
+    subquery.layout = (options, layout)
+    return layout
+
+
+def is_verbatim(tokens: list, subquery: Subquery) -> bool:
+    """Whether there's a ; inside of the parentheses, see process_subquery."""
+    return any(tokens[i].text == ";" for i in range(subquery.open + 1, subquery.close))
+
+
+def layout_subqueries(
+    tokens: list,
+    statement: Statement,
+    indent: str,
+    line_length: int = 100,
+    starting_indent: str = "",
+    debug: bool = False,
+) -> None:
+    """Lay out all of the subqueries in a Statement (see layout_subquery), innermost first,
+    each on the lines the layout of the statement will put it on,
+    so laying out a subquery only ever finds the ones inside of it already done.
+    (Otherwise it'd recurse, several calls deep for every level the subqueries are nested.)"""
+    # (subquery, the indent of its lines), each after the one it's in
+    found = []
+    pending = [(statement, starting_indent)]
+    while len(pending) > 0:
+        statement, starting_indent = pending.pop()
+        for clause in statement.clauses:
+            # see layout_statement: SELECT expressions and WHERE conditions are indented,
+            # and process_subquery puts what's inside of the parentheses one indent further in
+            if clause.keyword in ("SELECT", "WHERE"):
+                inner_indent = starting_indent + indent + indent
+            else:
+                inner_indent = starting_indent + indent
+            for item in clause.items:
+                # a CASE (or the body of a clause with one) is laid out as text, with what's in it
+                if not isinstance(item, Expression) or isinstance(item, Case):
+                    continue
+                for subquery in item.children:
+                    if isinstance(subquery, Subquery) and not is_verbatim(tokens, subquery):
+                        found.append((subquery, inner_indent))
+                        pending.append((subquery.statement, inner_indent))
+    if len(found) == 0:
+        return
+    profile = profiling.active
+    if profile is not None:
+        hits = subquery_cache.hits
+        start = perf_counter()
+    for subquery, inner_indent in reversed(found):
+        layout_subquery(tokens, subquery, indent, line_length, inner_indent, debug)
+    if profile is not None:
+        profile.record("subqueries", perf_counter() - start)
+        profile.count("subqueries", len(found))
+        profile.count("subqueries cached", subquery_cache.hits - hits)
+
+
+def process_subquery(
+    tokens: list,
+    subquery: Subquery,
+    indent: str,
+    line_length: int = 100,
+    starting_indent: str = "",
+    debug: bool = False,
+) -> list:
+    """A subquery in an expression that starts on a line indented by `starting_indent`.
+    What's inside of the parentheses is laid out on its own (see layout_subquery),
+    one indent further in, and the ( and ) end and start lines of their own:
+
+        (
+            SELECT a
+            FROM t
+        )
+
+    Parentheses with a ; inside aren't a subquery we know what to do with,
+    so they're left alone."""
+    if is_verbatim(tokens, subquery):
+        return text_doc(render(tokens, subquery.open, subquery.close + 1))
+    formatted = layout_subquery(
+        tokens, subquery, indent, line_length, starting_indent + indent, debug
+    )
+    # the lines come already indented
+    return ["(", Dedent([HARDLINE, text_doc(formatted.rstrip("\n"))]), HARDLINE, ")"]
+
+
+def process_expression(
+    tokens: list,
+    expression: Expression,
+    indent: str,
+    line_length: int = 100,
+    starting_indent: str = "",
+    debug: bool = False,
+    column: int = None,
+):
+    """This function accepts an Expression node (that starts on a line indented by
+    `starting_indent`, `column` characters in if that's not right after the indent)
+    and makes a document for it.
+    The trailing comment of the expression (if there is one) is left to the caller,
+    since where it goes depends on how the whole group is laid out."""
+    if isinstance(expression, Case):
+        # The Case can only end up broken over lines (and so starting a line of its own)
+        # if it doesn't fit there, so we can lay it out on its own
+        layout = layout_case(
+            tokens, expression, indent, line_length, starting_indent, debug, column
+        )
+        if "\n" not in layout:
+            return layout
+        # the lines after the first one come already indented
+        lines = layout.split("\n")
+        return [lines[0], Dedent([HARDLINE, join(HARDLINE, lines[1:])])]
+    doc = []
+    start = expression.start
+    for subquery in expression.children:
+        if not isinstance(subquery, Subquery):
+            continue
+        if subquery.open > start:
+            doc.append(text_doc(render(tokens, start, subquery.open)))
+            doc.append(text_doc(separator(tokens[subquery.open - 1], tokens[subquery.open])))
+        doc.append(process_subquery(tokens, subquery, indent, line_length, starting_indent, debug))
+        start = subquery.close + 1
+    if start == expression.start:
+        return text_doc(render(tokens, expression.start, expression.end))
+    if expression.end > start:
+        doc.append(text_doc(separator(tokens[start - 1], tokens[start])))
+        doc.append(text_doc(render(tokens, start, expression.end)))
+    return doc
+
+
+def process_select(
+    tokens: list,
+    clause: Clause,
+    indent: str,
+    debug: bool = False,
+    line_length: int = 100,
+    starting_indent: str = "",
+) -> Group:
+    """The SELECT expressions:
+    all on the SELECT line if they fit
+    (and there are no comments on their own lines, and no expression spans several lines),
+    with the comments at the end of the expressions gathered at the end of the line,
+    otherwise one per line, indented."""
+    items = []
+    for n, item in enumerate(clause.items):
+        if isinstance(item, Comment):
+            # a comment on its own line, breaking up the group
+            items += [LINE, "-- " + get_comment(tokens, item), BREAK_PARENT]
+            if debug:
+                trace("found a comment: %r", items[-2])
+            continue
+        expression = process_expression(
+            tokens, item, indent, line_length, starting_indent + indent, debug
+        )
+        if debug:
+            trace("found an expression: %r", (expression, get_comment(tokens, item.comment)))
+        items += [LINE, expression]
+        if n < len(clause.items) - 1:
+            items.append(",")
+        items += trailing_comment_doc(tokens, item.comment)
+    return Group(
+        [clause.keyword] + trailing_comment_doc(tokens, clause.comment) + [Nest(indent, items)]
+    )
+
+
+def process_with(
+    tokens: list,
+    clause: Clause,
+    indent: str,
+    line_length: int = 100,
+    starting_indent: str = "",
+    debug: bool = False,
+) -> list:
+    """The common table expressions of a WITH, each starting a line of its own,
+    with their queries formatted like any other subquery:
+
+        WITH a AS (
+            SELECT ...
+        ),
+        b AS (
+            SELECT ...
+        )
+    """
+    doc = [clause.keyword] + trailing_comment_doc(tokens, clause.comment)
+    for n, item in enumerate(clause.items):
+        if isinstance(item, Comment):
+            doc += [HARDLINE, "-- " + get_comment(tokens, item)]
+            continue
+        doc += [" " if n == 0 else HARDLINE]
+        doc.append(process_expression(tokens, item, indent, line_length, starting_indent, debug))
+        if n < len(clause.items) - 1:
+            doc.append(",")
+        doc += trailing_comment_doc(tokens, item.comment)
+    return doc
+
+
+def process_leading(tokens: list, items: list) -> list:
+    """Whatever comes before the first clause:
+    comments each go on their own line,
+    anything else gets collapsed onto a line."""
+    doc = []
+    for item in items:
+        if isinstance(item, Comment):
+            doc += [render_token(tokens[item.token]), HARDLINE]
+        else:
+            doc += [text_doc(render(tokens, item.start, item.end)), HARDLINE]
+    return doc
+
+
+def parse(  # noqa: C901
+    text: str,
+    line_length=100,
+    debug: bool = False,
+    indent=" " * 4,
+    starting_indent: str = "",
+    out=None,
+) -> str:
+    # TODO:
+    # If a lone-line comment is detected, don't try to combine lines before/after it
+    # Combine end of line comments when combining statements
+    # Try sqlparse on my examples
+    #    Looking at the code, they specifically capture A LOT of tokens
+    #    reindent='aligned' is what I liked before
+    # Here, going for more of the black approach
+    #
+    # Every line is indented by starting_indent (and still fits in line_length),
+    # which is how subqueries get laid out (see layout_subquery).
+    #
+    # With `out`, the lines are written to it as they're done, instead of returned
+    # (see write_stream).
+    #
+    # With a profiling.Profile active, the time each phase takes is recorded in it.
+    profile = profiling.active
+    if profile is not None:
+        profile.count("statements")
+        profile.count("bytes", len(text))
+        clock = perf_counter()
+
+    # One pass to cut the text up into tokens,
+    # and one more to build the tree of clauses and expressions out of them.
+    # Then we describe the layout as a document (see layout.py),
+    # and one last pass prints it, deciding what fits on a line.
+    tokens = tokenize(text)
+    if profile is not None:
+        profile.count("tokens", len(tokens))
+        clock = profile.lap("tokenize", clock)
+    statement = build_statement(tokens)
+    if debug:
+        trace("statement=%r", statement)
+    if profile is not None:
+        clock = profile.lap("build", clock)
+
+    layout_subqueries(tokens, statement, indent, line_length, starting_indent, debug)
+    doc = layout_statement(tokens, statement, indent, line_length, starting_indent, debug)
+
+    if profile is not None:
+        clock = profile.lap("layout", clock)
+    if out is not None:
+        out.write(starting_indent)
+        formatted = pretty(doc, line_length, starting_indent, len(starting_indent), out)
+    else:
+        formatted = starting_indent + pretty(
+            doc, line_length, starting_indent, len(starting_indent)
+        )
+    if profile is not None:
+        profile.lap("print", clock)
+    return formatted
+
+
+def layout_statement(
+    tokens: list,
+    statement: Statement,
+    indent: str,
+    line_length: int = 100,
+    starting_indent: str = "",
+    debug: bool = False,
+) -> list:
+    """The document for a Statement, one clause after the other."""
+    doc = process_leading(tokens, statement.leading)
+    # The high level clause we're in
+    # from the list given by `ORDERED_GROUPS`
+    # e.g., "SELECT" or "FROM" or "WHERE"
+    current_clause = None
+    for clause in statement.clauses:
+        previous_clause, current_clause = current_clause, clause.keyword
+        if current_clause == "SELECT":
+            doc.append(process_select(tokens, clause, indent, debug, line_length, starting_indent))
+        elif current_clause == "WITH":
+            doc += process_with(tokens, clause, indent, line_length, starting_indent, debug)
+        elif current_clause == "INTO" and previous_clause == "SELECT":
+            raise RuntimeError("No support for INTO clause")
+        elif current_clause == "WHERE":
+            doc.append(process_where(tokens, clause, indent, line_length, starting_indent))
+        else:
+            # FROM, joins, and everything else:
+            # try to keep it on the line with the keyword
+            doc.append(process_from(tokens, clause, indent, line_length, starting_indent))
+        doc.append(HARDLINE)
+        for comment in clause.end_comments:
+            doc += ["-- " + get_comment(tokens, comment), HARDLINE]
+    return doc
+
+
+def format_statements(statements: list, **kwargs) -> list:
+    """Format a batch of statements, in a worker process."""
+    return [parse(statement, **kwargs) for statement in statements]
+
+
+def format_statements_parallel(statements: Iterable[str], workers: int, **kwargs) -> Iterator[str]:
+    """Format statements across a pool of processes, handing them back in order.
+    Statements are sent out in batches of about `PARALLEL_BATCH_SIZE` characters,
+    and only a few batches per worker are in flight at a time,
+    so we don't read the whole input before the first results come back."""
+    # (imported here, multiprocessing takes a while to import)
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        batch, size = [], 0
+        for statement in chain(statements, [None]):
+            if statement is not None:
+                batch.append(statement)
+                size += len(statement)
+            if len(batch) > 0 and (statement is None or size >= PARALLEL_BATCH_SIZE):
+                pending.append(executor.submit(format_statements, batch, **kwargs))
+                batch, size = [], 0
+            while len(pending) > 0 and (statement is None or len(pending) >= 4 * workers):
+                yield from pending.popleft().result()
+
+
+def format_stream(chunks: Iterable[str], workers: int = 1, **kwargs) -> Iterator[str]:
+    """Format a script with any number of ;-separated statements,
+    arriving as an iterable of text chunks (lines of a file, blocks off a socket, ...).
+    Each statement is formatted on its own with `parse` (which gets the kwargs),
+    and handed back as soon as it's done,
+    so we only ever hold on to one statement at a time.
+    Statements are separated by a blank line.
+
+    With workers > 1, statements are formatted across that many processes,
+    as long as there's at least `PARALLEL_MIN_SIZE` characters of SQL:
+    for less than that, starting the pool costs more than it saves."""
+    return format_statements_stream(iter_statements(chunks), workers, **kwargs)
+
+
+def format_statements_stream(
+    statements: Iterable[str], workers: int = 1, **kwargs
+) -> Iterator[str]:
+    """format_stream, for a script that's been cut up into statements already
+    (by iter_statements, or split_script for a whole script in memory)."""
+    if profiling.active is not None:
+        statements = profiling.active.timed(statements, "split")
+    formatted = None
+    if workers > 1:
+        # hold on to statements until we know whether there's enough of them
+        head, size = [], 0
+        for statement in statements:
+            head.append(statement)
+            size += len(statement)
+            if size >= PARALLEL_MIN_SIZE:
+                break
+        statements = chain(head, statements)
+        if size >= PARALLEL_MIN_SIZE:
+            formatted = format_statements_parallel(statements, workers, **kwargs)
+    if formatted is None:
+        formatted = (parse(statement, **kwargs) for statement in statements)
+    for i, statement in enumerate(formatted):
+        yield ("\n" if i > 0 else "") + statement
+
+
+def write_stream(chunks: Iterable[str], out, workers: int = 1, **kwargs) -> None:
+    """format_stream, writing to `out` (a file, sys.stdout, a socket's makefile(), ...)
+    instead of handing the statements back:
+    each line goes out as soon as it's laid out, so not even a whole statement
+    is held on to as one string."""
+    if workers > 1:
+        # the workers hand back whole statements anyway
+        out.writelines(format_stream(chunks, workers, **kwargs))
+        return
+    statements = iter_statements(chunks)
+    if profiling.active is not None:
+        statements = profiling.active.timed(statements, "split")
+    for i, statement in enumerate(statements):
+        if i > 0:
+            out.write("\n")
+        parse(statement, out=out, **kwargs)
+
+
+# What format_bytes hands back:
+# output is the formatted SQL (encoded like the input), or the input as-is if it can't be formatted,
+# changed is whether output is any different from the input,
+# seconds is how long it took,
+# and error says why it couldn't be formatted (None if it could).
+FormatResult = namedtuple("FormatResult", ["output", "changed", "seconds", "error"])
+
+
+def format_str(sql: str, *, line_length: int = 100, indent: str = " " * 4) -> str:
+    """Format SQL in memory: any number of statements, formatted just like
+    `brown` would format a file with sql in it.
+    Raises (RuntimeError, mostly) if it can't be formatted."""
+    return "".join(
+        format_statements_stream(split_script(sql), line_length=line_length, indent=indent)
+    )
+
+
+def format_bytes(
+    data: bytes, *, line_length: int = 100, indent: str = " " * 4, encoding: str = "utf-8"
+) -> FormatResult:
+    """format_str for SQL that comes as bytes (off of a socket, out of an editor, ...),
+    with a FormatResult instead of raising if it can't be formatted."""
+    start = perf_counter()
+    try:
+        output = format_str(data.decode(encoding), line_length=line_length, indent=indent)
+    except Exception as e:
+        return FormatResult(data, False, perf_counter() - start, f"{type(e).__name__}: {e}")
+    output = output.encode(encoding)
+    return FormatResult(output, output != data, perf_counter() - start, None)
+
+
+def get_trailing_comment(text: str) -> str:
+    i = 0
+    rest_of_line = ""
+    while text[i] != "\n":
+        rest_of_line += text[i]
+        i += 1
+    if "--" in rest_of_line:
+        group_trailing_comment = rest_of_line.split("--")[1].strip()
+    else:
+        group_trailing_comment = None
+    return group_trailing_comment
+
+
+def format_trailing_comment(comment: str) -> str:
+    if comment is not None:
+        return f"  -- {comment}"
+    else:
+        return ""
+
+
+def enable_trace() -> None:
+    """Send the formatter's trace events to stderr."""
+    import logging
+
+    logger = logging.getLogger(__name__)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(funcName)s: %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+
+
+def __getattr__(name: str):
+    # the command line lives in brown.cli, so that importing brown doesn't import click,
+    # but it used to be here
+    if name in ("main", "format_file", "find_sql_files"):
+        from . import cli
+
+        return getattr(cli, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,89 @@
+"""Cache of files we've already formatted, so we can skip parsing them.
+
+Like black, there's one cache file per version of brown and set of options.
+The version includes a hash of the formatter's source,
+so a change to how anything gets formatted starts a fresh cache
+even if nobody remembered to bump __version__.
+Inside, files are identified by a hash of their contents (not their path),
+so a file that hasn't changed since we formatted it
+(or a copy of it somewhere else) is known to be formatted already.
+Each entry remembers when it was last seen, and entries that haven't been
+seen in a while are dropped when the cache is written back.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from functools import lru_cache
+from pathlib import Path
+
+# entries not seen for this long (in seconds) are dropped
+MAX_AGE = 60 * 60 * 24 * 30
+# and we keep at most this many, most recently seen first
+MAX_ENTRIES = 100_000
+
+
+def get_cache_dir() -> Path:
+    """$BROWN_CACHE_DIR if it's set, otherwise brown/ in the user's cache directory."""
+    if (cache_dir := os.environ.get("BROWN_CACHE_DIR")) is not None:
+        return Path(cache_dir)
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "brown"
+
+
+@lru_cache(maxsize=None)
+def get_formatter_digest() -> str:
+    """A hash of the source of brown (all of it, it's small)."""
+    digest = hashlib.sha256()
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.name.encode() + b"\0" + path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def get_cache_prefix(version: str) -> str:
+    """How the names of the cache files for this version of brown start."""
+    return f"cache-{version}-{get_formatter_digest()}-"
+
+
+def get_cache_file(version: str, line_length: int, indent: str) -> Path:
+    options = hashlib.sha256(f"{line_length}|{indent}".encode()).hexdigest()[:16]
+    return get_cache_dir() / f"{get_cache_prefix(version)}{options}.json"
+
+
+def get_digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def read_cache(version: str, line_length: int, indent: str) -> dict:
+    """{digest: last seen} for the files already formatted with these options."""
+    try:
+        return json.loads(get_cache_file(version, line_length, indent).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def write_cache(cache: dict, digests: list, version: str, line_length: int, indent: str) -> None:
+    """Mark `digests` as formatted, evict stale entries, and save the cache.
+    Caches from other versions of brown are removed, since they can't be used anymore."""
+    now = time.time()
+    cache = {**cache, **dict.fromkeys(digests, now)}
+    fresh = sorted([(t, x) for x, t in cache.items() if now - t < MAX_AGE], reverse=True)
+    cache = {x: t for t, x in fresh[:MAX_ENTRIES]}
+
+    cache_file = get_cache_file(version, line_length, indent)
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        for old in cache_file.parent.glob("cache-*.json"):
+            if not old.name.startswith(get_cache_prefix(version)):
+                old.unlink()
+        # write to the side and move it in place,
+        # so that runs going at the same time don't see half a file
+        with tempfile.NamedTemporaryFile(
+            "w", dir=cache_file.parent, prefix=".cache-", delete=False
+        ) as f:
+            json.dump(cache, f)
+        os.replace(f.name, cache_file)
+    except OSError:
+        # not being able to cache is not a reason to fail
+        pass
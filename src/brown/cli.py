@@ -0,0 +1,263 @@
+"""The brown command line: format files and directories of SQL in place,
+or standard input to standard output (`brown -`, for editors).
+
+Kept apart from the formatter itself, so that using brown as a library
+doesn't pay for importing click (and everything the CLI needs).
+"""
+
+import contextlib
+import difflib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import click
+
+from . import __version__, enable_trace, format_statements_stream, format_str, write_stream
+from .cache import get_digest, read_cache, write_cache
+from .lexer import split_script
+from .profiling import Profile
+from .verify import verify_formatted
+
+# how many of the slowest files --profile lists
+PROFILE_SLOWEST = 10
+
+
+def find_sql_files(paths: tuple) -> list:
+    """Expand the paths given on the command line:
+    files are taken as-is, directories are searched recursively for *.sql."""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files += sorted(path.rglob("*.sql"))
+        else:
+            files.append(path)
+    return files
+
+
+def make_diff(raw: str, parsed: str, name) -> str:
+    return "".join(
+        difflib.unified_diff(
+            raw.splitlines(keepends=True),
+            parsed.splitlines(keepends=True),
+            fromfile=f"{name}\toriginal",
+            tofile=f"{name}\tformatted",
+        )
+    )
+
+
+def format_file(
+    file: Path,
+    line_length: int,
+    debug: bool = False,
+    write: bool = True,
+    diff: bool = False,
+    workers: int = 1,
+    profile: bool = False,
+    verify: bool = False,
+) -> dict:
+    """Format a single file, writing it back only if the formatting changed it
+    (and `write` is on).
+    With workers > 1, the statements of a large file are formatted in parallel.
+    With `verify` on (for --check), a file that verify_formatted can tell is already formatted
+    isn't formatted again (unless we're tracing or profiling the formatter).
+    Returns {"file", "status", "error", "digest", "diff", "profile"} where status is one of
+    "changed", "unchanged", or "failed" (with the error message),
+    digest is the hash of the formatted contents,
+    diff is a unified diff of the change if `diff` is on,
+    and profile is the Profile of formatting it if `profile` is on (otherwise None).
+    This runs in the worker processes, so it can't raise."""
+    if debug:
+        # worker processes don't necessarily inherit our logging setup
+        enable_trace()
+    recorded = Profile() if profile else None
+    if profile:
+        # a profile only sees this process
+        workers = 1
+    try:
+        raw = file.read_text()
+        if verify and not debug and not profile and verify_formatted(raw, line_length):
+            parsed = raw
+        else:
+            with recorded if recorded is not None else contextlib.nullcontext():
+                statements = split_script(raw)
+                parsed = "".join(
+                    format_statements_stream(
+                        statements, workers=workers, line_length=line_length, debug=debug
+                    )
+                )
+        if write and parsed != raw:
+            file.write_text(parsed)
+    except Exception as e:
+        return {"file": file, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+    patch = make_diff(raw, parsed, file) if diff and parsed != raw else None
+    return {
+        "file": file,
+        "status": "changed" if parsed != raw else "unchanged",
+        "error": None,
+        "digest": get_digest(parsed),
+        "diff": patch,
+        "profile": recorded,
+    }
+
+
+def print_profile(results: list) -> None:
+    """Where the time went, over all of the files and for the slowest of them."""
+    profiles = [x for x in results if x.get("profile") is not None]
+    total = Profile()
+    for result in profiles:
+        total.merge(result["profile"])
+    click.echo(f"profile of {len(profiles)} file(s): {total.report()}", err=True)
+    slowest = sorted(profiles, key=lambda x: -x["profile"].total())[:PROFILE_SLOWEST]
+    if len(slowest) > 0:
+        click.echo("slowest files:", err=True)
+    for result in slowest:
+        profile = result["profile"]
+        click.echo(f"{profile.total():8.3f}s {result['file']} ({profile.summary()})", err=True)
+
+
+def format_stdin(
+    line_length: int, check: bool, diff: bool, debug: bool = False, profile: bool = False
+) -> None:
+    """brown -: format standard input to standard output.
+    Statements are formatted as they're read, but nothing is written out
+    until all of them have been, so a statement that can't be formatted
+    leaves nothing but the error behind (instead of the statements before it).
+    With --check or --diff, only the diff is written out,
+    and the exit code says whether it would change."""
+    if debug:
+        enable_trace()
+    stdin = click.get_text_stream("stdin")
+    recorded = Profile() if profile else None
+    try:
+        with recorded if recorded is not None else contextlib.nullcontext():
+            if check or diff:
+                raw = stdin.read()
+                if check and not debug and not profile and verify_formatted(raw, line_length):
+                    parsed = raw
+                else:
+                    parsed = format_str(raw, line_length=line_length)
+            else:
+                out = io.StringIO()
+                write_stream(stdin, out, line_length=line_length)
+    except Exception as e:
+        click.echo(f"error: cannot format -: {type(e).__name__}: {e}", err=True)
+        raise SystemExit(1)
+    if not check and not diff:
+        click.get_text_stream("stdout").write(out.getvalue())
+    if profile:
+        print_profile([{"file": "-", "profile": recorded}])
+    if check or diff:
+        if diff and parsed != raw:
+            click.echo(make_diff(raw, parsed, "-"), nl=False)
+        elif check and parsed != raw:
+            click.echo("would reformat -", err=True)
+        if check and parsed != raw:
+            raise SystemExit(1)
+
+
+@click.command()
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True, allow_dash=True))
+@click.option("--line-length", default=100)
+@click.option(
+    "--check",
+    is_flag=True,
+    help="Don't write the files back, exit with 1 if any of them would change.",
+)
+@click.option(
+    "--diff", is_flag=True, help="Don't write the files back, print a diff of the changes instead."
+)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    show_default=True,
+    help="Number of processes to format files with.",
+)
+@click.option("--trace", is_flag=True, help="Print what the formatter is doing to stderr.")
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Print where the time went to stderr: per phase, in total and for the slowest files.",
+)
+def main(  # noqa: C901
+    paths: tuple,
+    line_length: int,
+    check: bool,
+    diff: bool,
+    workers: int,
+    trace: bool,
+    profile: bool,
+):
+    if "-" in paths:
+        if len(paths) > 1:
+            raise click.UsageError("- (standard input) can't be combined with other paths")
+        return format_stdin(line_length, check, diff, trace, profile)
+
+    files = find_sql_files(paths)
+
+    # skip anything we've already formatted with these options
+    indent = " " * 4
+    cache = read_cache(__version__, line_length, indent)
+    results, todo = [], []
+    for file in files:
+        try:
+            digest = get_digest(file.read_text())
+        except (OSError, UnicodeDecodeError):
+            # let format_file report it
+            digest = None
+        if digest in cache:
+            results.append({"file": file, "status": "unchanged", "error": None, "digest": digest})
+        else:
+            todo.append(file)
+
+    format_one = partial(
+        format_file,
+        line_length=line_length,
+        debug=trace,
+        write=not (check or diff),
+        diff=diff,
+        profile=profile,
+        verify=check,
+    )
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as executor:
+            results += executor.map(format_one, todo)
+    else:
+        # with just the one file, spread its statements over the workers instead
+        results += [format_one(file, workers=workers) for file in todo]
+
+    write_cache(
+        cache,
+        [x["digest"] for x in results if x["status"] != "failed"],
+        __version__,
+        line_length,
+        indent,
+    )
+
+    if profile:
+        print_profile(results)
+
+    counts = {"changed": 0, "unchanged": 0, "failed": 0}
+    for result in results:
+        counts[result["status"]] += 1
+        if result["error"] is not None:
+            click.echo(f"error: cannot format {result['file']}: {result['error']}", err=True)
+        elif result.get("diff") is not None:
+            click.echo(result["diff"], nl=False)
+        elif check and result["status"] == "changed":
+            click.echo(f"would reformat {result['file']}", err=True)
+    click.echo(
+        f"{counts['changed']} file(s) {'would be changed' if check or diff else 'changed'}, "
+        + f"{counts['unchanged']} unchanged, {counts['failed']} failed.",
+        err=True,
+    )
+    if counts["failed"] > 0 or (check and counts["changed"] > 0):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
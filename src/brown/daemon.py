@@ -0,0 +1,135 @@
+"""brownd: keep the formatter warm in a long-running process, like blackd.
+
+Editors and pre-commit hooks that run `brown` on every save pay for starting
+the interpreter and importing everything each time, which takes longer than
+formatting a typical file. Instead, start this once:
+
+    python -m brown.daemon --bind-port 45485
+    python -m brown.daemon --socket /tmp/brownd.sock
+
+and POST the SQL to it:
+
+    curl --data-binary @model.sql -H "X-Line-Length: 80" http://localhost:45485/
+    curl --data-binary @model.sql --unix-socket /tmp/brownd.sock http://localhost/
+
+The response is
+200 with the formatted SQL,
+204 (and no body) if the SQL is already formatted,
+or 400 with the error if it can't be formatted.
+Recent results are kept in memory, so saving the same buffer again
+doesn't format it again.
+"""
+
+import errno
+import logging
+import os
+import socketserver
+import stat
+from functools import lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+
+from . import __version__, format_str
+
+# how many recent (sql, options) results to remember
+CACHE_SIZE = 1024
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def format_text(sql: str, line_length: int) -> str:
+    return format_str(sql, line_length=line_length)
+
+
+class FormatHandler(BaseHTTPRequestHandler):
+    server_version = f"brownd/{__version__}"
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        try:
+            line_length = int(self.headers.get("X-Line-Length", 100))
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            return self.reply(HTTPStatus.BAD_REQUEST, "Invalid X-Line-Length or Content-Length\n")
+        try:
+            sql = self.rfile.read(length).decode()
+        except UnicodeDecodeError as e:
+            return self.reply(HTTPStatus.BAD_REQUEST, f"Request is not UTF-8: {e}\n")
+        try:
+            formatted = format_text(sql, line_length)
+        except Exception as e:
+            return self.reply(HTTPStatus.BAD_REQUEST, f"{type(e).__name__}: {e}\n")
+        if formatted == sql:
+            return self.reply(HTTPStatus.NO_CONTENT)
+        self.reply(HTTPStatus.OK, formatted)
+
+    def reply(self, status: HTTPStatus, body: str = "") -> None:
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("X-Brown-Version", __version__)
+        if status != HTTPStatus.NO_CONTENT:
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self) -> str:
+        # the peer of a Unix socket has no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            # left over from a previous run, but only if it's a socket:
+            # anything else is somebody's file, at a mistyped --socket
+            if not stat.S_ISSOCK(os.stat(self.server_address).st_mode):
+                raise FileExistsError(
+                    errno.EEXIST, "exists and isn't a socket, not replacing it", self.server_address
+                )
+            os.unlink(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+
+def make_server(host: str = "localhost", port: int = 45485, socket: str = None):
+    """An HTTP server for FormatHandler, on a Unix socket if `socket` is given,
+    otherwise on host:port (port 0 picks a free one).
+    Call serve_forever() on it to start answering."""
+    if socket is not None:
+        return UnixHTTPServer(socket, FormatHandler)
+    return ThreadingHTTPServer((host, port), FormatHandler)
+
+
+@click.command()
+@click.option("--bind-host", default="localhost", show_default=True, help="Address to listen on.")
+@click.option("--bind-port", default=45485, show_default=True, help="Port to listen on.")
+@click.option("--socket", type=click.Path(), help="Listen on this Unix socket instead.")
+def main(bind_host: str, bind_port: int, socket: str):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        server = make_server(bind_host, bind_port, socket)
+    except FileExistsError as e:
+        raise click.BadParameter(str(e), param_hint="--socket")
+    where = socket if socket is not None else f"http://{bind_host}:{server.server_port}/"
+    click.echo(f"brownd {__version__} listening on {where}", err=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket is not None and os.path.exists(socket):
+            os.unlink(socket)
+
+
+if __name__ == "__main__":
+    main(prog_name="brownd")
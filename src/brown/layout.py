@@ -0,0 +1,216 @@
+"""A small Wadler/Oppen style pretty printer.
+
+Instead of every clause building its one line version as a string,
+measuring it, and building the broken up version if it's too long,
+the formatter describes the layout once as a document:
+
+    str            text, printed as-is (never containing a newline)
+    list           the documents one after the other
+    LINE           a space, or a line break if the group it's in doesn't fit
+    SOFTLINE       nothing, or a line break
+    HARDLINE       always a line break (so the groups around it never fit)
+    Group(doc)     print doc on one line if it fits, otherwise break its LINEs
+    Nest(i, doc)   line breaks in doc are indented by i more
+    Dedent(doc)    line breaks in doc aren't indented at all
+                   (for text that's already indented, like a subquery formatted on its own)
+    LineSuffix(s)  s goes at the end of the line it's on, just before the line break
+                   (trailing comments, which would eat anything after them)
+    BREAK_PARENT   nothing, but the groups around it never fit
+
+and `pretty` decides which groups fit, as it prints
+(into a string, or a line at a time into a file or anything else with a write method).
+The width of a group on one line is measured the first time it's needed
+and kept on the group, so a group's width is only ever added up once,
+and each fit decision is a comparison:
+laying out a document is linear in its size, however deeply nested it is.
+"""
+
+# the width of anything that can't go on one line
+INFINITY = float("inf")
+
+
+class Line:
+    """A place where the line can break.
+    flat is what's printed if it doesn't: None if it has to."""
+
+    __slots__ = ("flat",)
+
+    def __init__(self, flat: str):
+        self.flat = flat
+
+    def __repr__(self) -> str:
+        return f"Line({self.flat!r})"
+
+
+LINE = Line(" ")
+SOFTLINE = Line("")
+HARDLINE = Line(None)
+BREAK_PARENT = Line(None)
+
+
+class Group:
+    __slots__ = ("doc", "width")
+
+    def __init__(self, doc):
+        self.doc = doc
+        # the width of doc on one line, once we've measured it
+        self.width = None
+
+    def __repr__(self) -> str:
+        return f"Group({self.doc!r})"
+
+
+class Nest:
+    __slots__ = ("indent", "doc")
+
+    def __init__(self, indent: str, doc):
+        self.indent = indent
+        self.doc = doc
+
+    def __repr__(self) -> str:
+        return f"Nest({self.indent!r}, {self.doc!r})"
+
+
+class Dedent:
+    __slots__ = ("doc",)
+
+    def __init__(self, doc):
+        self.doc = doc
+
+    def __repr__(self) -> str:
+        return f"Dedent({self.doc!r})"
+
+
+class LineSuffix:
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __repr__(self) -> str:
+        return f"LineSuffix({self.text!r})"
+
+
+def join(separator, docs: list) -> list:
+    """docs, with separator between each of them."""
+    joined = []
+    for i, doc in enumerate(docs):
+        if i > 0:
+            joined.append(separator)
+        joined.append(doc)
+    return joined
+
+
+def measure(doc) -> float:
+    """The width of doc printed on one line (INFINITY if it can't be).
+    Line suffixes count, since they end up on the line too:
+    comments only get gathered up at the end of a line if they fit on it."""
+    if type(doc) is str:
+        return len(doc)
+    if type(doc) is list:
+        total = 0
+        for x in doc:
+            if type(x) is str:
+                total += len(x)
+            elif x is HARDLINE or x is BREAK_PARENT:
+                # no need to look at the rest
+                return INFINITY
+            else:
+                total += measure(x)
+        return total
+    if type(doc) is Group:
+        if doc.width is None:
+            doc.width = measure(doc.doc)
+        return doc.width
+    if type(doc) is Line:
+        return INFINITY if doc.flat is None else len(doc.flat)
+    if type(doc) is Nest or type(doc) is Dedent:
+        return measure(doc.doc)
+    if type(doc) is LineSuffix:
+        return len(doc.text)
+    raise TypeError(f"Not a document: {doc!r}")
+
+
+def print_flat(doc, parts: list, suffixes: list) -> None:
+    """Print doc on one line, into parts (and its line suffixes into suffixes)."""
+    if type(doc) is str:
+        parts.append(doc)
+    elif type(doc) is list:
+        for x in doc:
+            if type(x) is str:
+                parts.append(x)
+            else:
+                print_flat(x, parts, suffixes)
+    elif type(doc) is Group or type(doc) is Nest or type(doc) is Dedent:
+        print_flat(doc.doc, parts, suffixes)
+    elif type(doc) is Line:
+        if doc.flat:
+            parts.append(doc.flat)
+    elif type(doc) is LineSuffix:
+        suffixes.append(doc.text)
+    else:
+        raise TypeError(f"Not a document: {doc!r}")
+
+
+def pretty(doc, width: int, indent: str = "", column: int = 0, out=None) -> str:  # noqa: C901
+    """Print doc, fitting it in `width` columns where we can.
+    Line breaks are indented by `indent` (plus whatever Nests they're in),
+    and the first line starts `column` characters in.
+    If `out` is given (a file, io.StringIO, a socket's makefile(), ...),
+    each line is written to it as soon as it's done,
+    and nothing is returned, so the whole text is never held in memory at once."""
+    parts = []
+    # line suffixes waiting for the end of the line
+    suffixes = []
+    # the indent for the line we just broke, put out with the first text on it
+    # (so there are no spaces at the end of empty lines)
+    pending = ""
+    # (indent, doc) still to print, the next one on top.
+    # Everything on here is outside of any group that fits (those get printed right away),
+    # so its lines break.
+    stack = [(indent, doc)]
+    while len(stack) > 0:
+        indent, doc = stack.pop()
+        if type(doc) is str:
+            if doc != "":
+                if pending:
+                    parts.append(pending)
+                    pending = ""
+                parts.append(doc)
+                column += len(doc)
+        elif type(doc) is list:
+            stack.extend([(indent, x) for x in reversed(doc)])
+        elif type(doc) is Group:
+            if measure(doc) <= width - column:
+                # it all goes on this line, no more decisions to make
+                if pending:
+                    parts.append(pending)
+                    pending = ""
+                start = len(parts)
+                print_flat(doc.doc, parts, suffixes)
+                column += sum([len(x) for x in parts[start:]])
+            else:
+                stack.append((indent, doc.doc))
+        elif type(doc) is Line:
+            if doc is not BREAK_PARENT:
+                parts += suffixes
+                suffixes = []
+                parts.append("\n")
+                if out is not None:
+                    out.write("".join(parts))
+                    parts = []
+                pending = indent
+                column = len(indent)
+        elif type(doc) is Nest:
+            stack.append((indent + doc.indent, doc.doc))
+        elif type(doc) is Dedent:
+            stack.append(("", doc.doc))
+        elif type(doc) is LineSuffix:
+            suffixes.append(doc.text)
+        else:
+            raise TypeError(f"Not a document: {doc!r}")
+    parts += suffixes
+    if out is not None:
+        out.write("".join(parts))
+        return None
+    return "".join(parts)
@@ -0,0 +1,259 @@
+"""Single-pass tokenizer.
+
+The formatter used to walk the text one character at a time, growing a buffer
+and re-checking every keyword against the tail of it.
+Here we cut the text into a flat list of tokens in one linear pass instead,
+and the formatter works on those.
+Every token keeps its offsets into the source, and how many newlines came
+right before it, which is what we need to tell a trailing comment
+(same line) from a comment on its own line.
+
+Brackets get matched up in the same pass, with a stack:
+each ( and ) knows how far away its partner is,
+so the formatter can jump over a whole group without rescanning it.
+Template blocks ({{ }}, {% %}, {# #}) and comments (-- up to the newline)
+come out as single tokens, so their closer is just the end of the token.
+
+For scripts with many statements, `iter_statements` uses the same pattern
+to cut text arriving in chunks into statements at the top level semicolons,
+without ever holding more than the statement it's working on.
+A big script that's already in memory can be cut up in bulk instead (`split_script`).
+"""
+
+import re
+from collections import namedtuple
+from collections.abc import Iterable, Iterator
+from functools import lru_cache
+from itertools import chain
+
+# Words we treat as keywords rather than identifiers.
+# This doesn't need to be the full reserved list, just the ones the formatter
+# makes decisions on (clauses, joins, CASE, boolean operators).
+KEYWORDS = frozenset(
+    (
+        "ALL",
+        "AND",
+        "AS",
+        "ASC",
+        "BETWEEN",
+        "BY",
+        "CASE",
+        "CROSS",
+        "DESC",
+        "DISTINCT",
+        "ELSE",
+        "END",
+        "EXCEPT",
+        "FOR",
+        "FROM",
+        "FULL",
+        "GROUP",
+        "HAVING",
+        "IN",
+        "INNER",
+        "INTERSECT",
+        "INTO",
+        "IS",
+        "JOIN",
+        "LEFT",
+        "LIMIT",
+        "MATCH",
+        "NATURAL",
+        "NOT",
+        "NULL",
+        "OFFSET",
+        "ON",
+        "OR",
+        "ORDER",
+        "OUTER",
+        "RIGHT",
+        "SELECT",
+        "THEN",
+        "TIMESERIES",
+        "UNION",
+        "UPDATE",
+        "USING",
+        "WHEN",
+        "WHERE",
+        "WITH",
+    )
+)
+
+# Texts at least this long get cut into statements by prescan.split_statements (see split_script)
+# (below that, importing NumPy takes longer than it saves)
+PRESCAN_MIN_SIZE = 1024 * 1024
+
+# One alternative per token kind, tried in order.
+# Every character of the input is matched by exactly one of these,
+# so a single finditer() walks the whole text.
+# Compiled by token_pattern() the first time we tokenize, not on import.
+TOKEN_REGEX = r"""
+    (?P<whitespace>\s+)
+    |(?P<comment>--[^\n]*)
+    |(?P<block_comment>/\*.*?\*/)
+    |(?P<template>\{\{.*?\}\}|\{%.*?%\}|\{\#.*?\#\})
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<quoted>"(?:[^"]|"")*")
+    |(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    |(?P<name>[^\W\d][\w$]*)
+    |(?P<open>\()
+    |(?P<close>\))
+    |(?P<unclosed>\{\{|\{%|\{\#|/\*|'|")
+    |(?P<punct>::|<=|>=|<>|!=|\|\||[^\s\w])
+    """
+
+
+# For the tokens that can be cut off at the end of a chunk (the `unclosed` group),
+# what ends them. See iter_statements.
+TOKEN_CLOSERS = {"'": "'", '"': '"', "{{": "}}", "{%": "%}", "{#": "#}", "/*": "*/"}
+
+
+@lru_cache(maxsize=None)
+def token_pattern() -> re.Pattern:
+    return re.compile(TOKEN_REGEX, re.VERBOSE | re.DOTALL)
+
+
+# kind, text, the start and end offsets into the source,
+# newlines: number of newlines in the whitespace right before this token,
+# pair: for ( and ), how many tokens away the matching bracket is
+# (positive for (, negative for ), 0 for everything else).
+# Relative, so it's still right in a slice that holds both.
+# (A plain namedtuple rather than typing.NamedTuple, so importing brown doesn't import typing.)
+Token = namedtuple("Token", ["kind", "text", "start", "end", "newlines", "pair"], defaults=[0])
+
+
+def line_col(text: str, offset: int) -> tuple:
+    """1-based line and column of an offset into text, for error messages."""
+    return text.count("\n", 0, offset) + 1, offset - text.rfind("\n", 0, offset)
+
+
+def tokenize(text: str) -> list:
+    """Split `text` into tokens, dropping the whitespace between them.
+
+    kind is one of:
+    keyword, name, number, string, comment, block_comment, template,
+    open, close, punct.
+    """
+    tokens = []
+    newlines = 0
+    # indices of the ( tokens still waiting for their )
+    opens = []
+    for match in token_pattern().finditer(text):
+        kind = match.lastgroup
+        value = match.group()
+        if kind == "whitespace":
+            newlines += value.count("\n")
+            continue
+        if kind == "name" and value.upper() in KEYWORDS:
+            kind = "keyword"
+        elif kind == "quoted":
+            kind = "name"
+        elif kind == "open":
+            opens.append(len(tokens))
+        elif kind == "close":
+            if len(opens) == 0:
+                line, col = line_col(text, match.start())
+                raise RuntimeError(f"Unbounded group: ')' at line {line}, column {col} has no (")
+            j = opens.pop()
+            tokens[j] = tokens[j]._replace(pair=len(tokens) - j)
+            tokens.append(Token(kind, value, match.start(), match.end(), newlines, j - len(tokens)))
+            newlines = 0
+            continue
+        elif kind == "unclosed":
+            line, col = line_col(text, match.start())
+            raise RuntimeError(
+                f"Unbounded group: '{value}' at line {line}, column {col} is never closed"
+            )
+        tokens.append(Token(kind, value, match.start(), match.end(), newlines))
+        newlines = 0
+    if len(opens) > 0:
+        line, col = line_col(text, tokens[opens[-1]].start)
+        raise RuntimeError(f"Unbounded group: '(' at line {line}, column {col} is never closed")
+    return tokens
+
+
+def iter_statements(chunks: Iterable[str]) -> Iterator[str]:  # noqa: C901
+    """Cut SQL text, arriving in chunks of any size, into statements.
+
+    Statements end at a ; that isn't inside of a string, comment, template, or parentheses.
+    A comment on the same line as the ; goes with the statement it follows.
+    Each statement is yielded (with its ;) as soon as we've seen the end of it,
+    and whatever is left after the last ; comes out last.
+    (For a whole script that's already in memory, see split_script.)
+    """
+    pattern = token_pattern()
+    # the text of the statement we're on that's been scanned already, in pieces
+    # (only joined up once the statement ends, so a statement arriving in a lot of chunks
+    # isn't copied over again for every one of them)
+    scanned = []
+    # what's left to scan: the token that ran into the end of the text so far,
+    # and the chunks that came in since
+    pending = []
+    # what has to come in before that token can end, if anything
+    closer = None
+    depth = 0
+    # the end of the statement in the buffer, once we've found its ;
+    end = None
+    for chunk in chain(chunks, [None]):
+        last = chunk is None
+        if not last:
+            pending.append(chunk)
+            # (an unclosed string or comment isn't matched again from its start until it can end)
+            if closer is not None and closer not in pending[-2][-1:] + chunk:
+                continue
+        buffer = "".join(pending)
+        # where the statement we're on starts in the buffer (if it started in it),
+        # and where to pick up scanning it
+        start = pos = 0
+        if end is not None:
+            end = 0
+        while pos < len(buffer):
+            match = pattern.match(buffer, pos)
+            kind = match.lastgroup
+            # a token that runs into the end of the buffer
+            # could keep going in the next chunk, so wait for it
+            if kind == "unclosed" or (match.end() == len(buffer) and not last):
+                if kind == "unclosed":
+                    closer = TOKEN_CLOSERS[match.group()]
+                else:
+                    closer = "\n" if kind == "comment" else None
+                break
+            if end is not None:
+                if kind == "comment" or (kind == "whitespace" and "\n" not in match.group()):
+                    pos = end = match.end()
+                    if kind == "whitespace":
+                        continue
+                yield "".join(scanned) + buffer[start:end]
+                scanned = []
+                start, pos, end, depth = end, end, None, 0
+                continue
+            if kind == "open":
+                depth += 1
+            elif kind == "close":
+                depth = max(depth - 1, 0)
+            elif kind == "punct" and depth == 0 and match.group() == ";":
+                end = match.end()
+            pos = match.end()
+        if not last:
+            scanned.append(buffer[start:pos])
+            pending = [buffer[pos:]]
+    if end is not None:
+        yield "".join(scanned) + buffer[start:end]
+        scanned = []
+        start = end
+    rest = "".join(scanned) + buffer[start:]
+    if rest.strip() != "":
+        yield rest
+
+
+def split_script(text: str) -> Iterator[str]:
+    """The statements of a whole script that's already in memory (a file read at once),
+    just like iter_statements([text]), but cut up in bulk with NumPy
+    if the text is at least `PRESCAN_MIN_SIZE` long and NumPy is installed (see prescan.py)."""
+    if len(text) >= PRESCAN_MIN_SIZE:
+        from .prescan import split_statements
+
+        if (statements := split_statements(text)) is not None:
+            yield from statements
+            return
+    yield from iter_statements([text])
@@ -0,0 +1,134 @@
+"""Finding the statements of a big script in bulk, with NumPy.
+
+`iter_statements` matches the text a token at a time in Python,
+which is most of the time spent on multi-megabyte generated scripts
+before any formatting starts.
+When the whole text is already in memory, the structure it needs can be
+worked out with array operations instead:
+
+1. the text as an array of code points,
+2. the spans of strings, comments and templates (which can hide anything),
+   found by jumping from one to the next with str.find, so the Python loop
+   only runs once per string or comment, not once per character,
+3. the parentheses depth at every offset, a cumsum over the ( and ) outside of those spans,
+4. and the ; outside of them at depth 0 are where the statements end.
+
+NumPy is optional: without it `split_statements` returns None,
+and split_script (which is what calls it) carries on with iter_statements as usual.
+Either way the statements come out exactly the same
+(on anything unusual, like a ) without a (, we return None and leave it to iter_statements).
+"""
+
+import re
+from bisect import bisect_left
+
+# what can start a string, quoted name, comment, or template
+OPENERS = "'\"-/{"
+# and what ends each of them, by the two characters they start with
+# (comments end at the end of the line, but the newline isn't part of them)
+CLOSERS = {"--": "\n", "/*": "*/", "{{": "}}", "{%": "%}", "{#": "#}"}
+
+WHITESPACE = re.compile(r"\s*")
+
+
+def load_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def find_spans(text: str, starts: list) -> tuple:
+    """The strings, quoted names, comments and templates in text,
+    given the offsets of every character that could start one (in order).
+    Returns ([(start, end)], cut) where cut is the offset of
+    a string, comment or template that's never closed (len(text) if there isn't one):
+    nothing after it is a statement boundary."""
+    spans = []
+    i = 0
+    while i < len(starts):
+        start = starts[i]
+        c = text[start]
+        if c == "'" or c == '"':
+            # a doubled quote is an escaped one
+            end = text.find(c, start + 1)
+            while end != -1 and text.startswith(c, end + 1):
+                end = text.find(c, end + 2)
+            if end == -1:
+                return spans, start
+            end += 1
+        else:
+            closer = CLOSERS.get(text[start : start + 2])
+            if closer is None:
+                # just a - or / or {
+                i += 1
+                continue
+            end = text.find(closer, start + 2)
+            if closer == "\n":
+                end = len(text) if end == -1 else end
+            elif end == -1:
+                return spans, start
+            else:
+                end += len(closer)
+        spans.append((start, end))
+        # skip over everything inside of it
+        i = bisect_left(starts, end, i + 1)
+    return spans, len(text)
+
+
+def statement_end(text: str, semicolon: int) -> int:
+    """Where the statement ending at the ; at text[semicolon] ends:
+    spaces after the ; go with it, and so does a comment on the same line."""
+    end = semicolon + 1
+    space = WHITESPACE.match(text, end).end()
+    if "\n" in text[end:space]:
+        return end
+    if text.startswith("--", space):
+        newline = text.find("\n", space)
+        return len(text) if newline == -1 else newline
+    return space
+
+
+def split_statements(text: str) -> list:
+    """The statements of text, like list(iter_statements([text])),
+    or None if NumPy isn't installed (or it's best left to iter_statements)."""
+    np = load_numpy()
+    if np is None:
+        return None
+    if text.isascii():
+        codes = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+    else:
+        # one element per character, so offsets in the array are offsets in the text
+        codes = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype="<u4")
+
+    is_opener = np.zeros(len(codes), dtype=bool)
+    for c in OPENERS:
+        is_opener |= codes == ord(c)
+    spans, cut = find_spans(text, np.flatnonzero(is_opener).tolist())
+
+    # +1 where a span starts and -1 where it ends, so the cumsum is > 0 inside of them
+    marks = np.zeros(len(codes) + 1, dtype=np.int32)
+    if len(spans) > 0:
+        bounds = np.array(spans)
+        marks[bounds[:, 0]] += 1
+        marks[bounds[:, 1]] -= 1
+    outside = np.cumsum(marks[:cut]) == 0
+    codes = codes[:cut]
+
+    parens = (codes == ord("(")).astype(np.int32) - (codes == ord(")"))
+    depth = np.cumsum(parens * outside)
+    if len(depth) > 0 and depth.min() < 0:
+        # iter_statements has its own ideas about a ) without a (
+        return None
+    semicolons = np.flatnonzero((codes == ord(";")) & outside & (depth == 0)).tolist()
+
+    statements = []
+    start = 0
+    for semicolon in semicolons:
+        end = statement_end(text, semicolon)
+        statements.append(text[start:end])
+        start = end
+    if text[start:].strip() != "":
+        statements.append(text[start:])
+    return statements
@@ -0,0 +1,108 @@
+"""Where the time goes: per-phase timers and counters for the formatter.
+
+    from brown.profiling import Profile
+
+    with Profile() as profile:
+        brown.parse(sql)
+    print(profile.report())
+
+While a Profile is active, the formatter times each phase of every statement:
+
+    split     cutting the script into statements (format_stream)
+    tokenize  cutting a statement into tokens
+    build     building the tree of clauses and expressions
+    layout    describing the layout as a document (including the subqueries,
+              which are laid out on their own first, and timed as subqueries too)
+    print     deciding what fits on a line, and putting the text together
+
+and counts statements, bytes, tokens, CASEs and subqueries
+(and how many of their layouts came out of the caches).
+
+To send these somewhere else, subclass Profile and override record() and count():
+they get called with every measurement as it's made.
+
+Only what runs in this process is recorded
+(format_stream with workers > 1 formats in other processes).
+With no Profile active, the formatter just checks `active` once per statement.
+"""
+
+from collections.abc import Iterator
+from time import perf_counter
+
+PHASES = ("split", "tokenize", "build", "layout", "print")
+
+# the Profile being recorded into, if any
+active = None
+
+
+class Profile:
+    __slots__ = ("seconds", "counts", "previous")
+
+    def __init__(self):
+        # seconds spent in each phase (and in subqueries, which are part of layout)
+        self.seconds = dict.fromkeys(PHASES + ("subqueries",), 0.0)
+        self.counts = {}
+        self.previous = None
+
+    def __enter__(self) -> "Profile":
+        global active
+        self.previous, active = active, self
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        global active
+        active, self.previous = self.previous, None
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def lap(self, phase: str, since: float) -> float:
+        """Record the time since `since` as spent in phase, and return the time now
+        (to time the next phase from)."""
+        now = perf_counter()
+        self.record(phase, now - since)
+        return now
+
+    def timed(self, items: Iterator, phase: str) -> Iterator:
+        """items, recording the time it takes to get each one as spent in phase."""
+        items = iter(items)
+        while True:
+            start = perf_counter()
+            item = next(items, None)
+            self.record(phase, perf_counter() - start)
+            if item is None:
+                return
+            yield item
+
+    def total(self) -> float:
+        """Seconds spent formatting, over all of the phases."""
+        return sum([self.seconds.get(x, 0.0) for x in PHASES])
+
+    def merge(self, other: "Profile") -> None:
+        """Add the measurements of other (e.g. from another file) to these."""
+        for phase, seconds in other.seconds.items():
+            self.record(phase, seconds)
+        for name, n in other.counts.items():
+            self.count(name, n)
+
+    def summary(self) -> str:
+        """The phases on one line, slowest first."""
+        phases = sorted(PHASES, key=lambda x: -self.seconds.get(x, 0.0))
+        return ", ".join([f"{x} {self.seconds.get(x, 0.0):.3f}s" for x in phases])
+
+    def report(self) -> str:
+        """The phases and counters, one per line."""
+        total = self.total()
+        lines = [f"{total:.3f}s formatting"]
+        for phase in PHASES:
+            seconds = self.seconds.get(phase, 0.0)
+            share = seconds / total if total > 0 else 0.0
+            lines.append(f"    {phase:<12} {seconds:8.3f}s {share:6.1%}")
+            if phase == "layout" and self.seconds.get("subqueries", 0.0) > 0:
+                lines.append(f"      subqueries {self.seconds['subqueries']:8.3f}s")
+        for name, n in self.counts.items():
+            lines.append(f"    {name:<24} {n:>10,}")
+        return "\n".join(lines)
@@ -0,0 +1,474 @@
+"""The formatter's intermediate representation: a small syntax tree.
+
+The token stream gets parsed into these nodes once, and the layout
+functions walk them, instead of every clause re-deriving its structure
+from strings.
+Nodes don't hold any text of their own: they point into the statement's
+token list by index (and the tokens point into the source by offset),
+so building the tree copies none of the SQL.
+There's a node for every expression and comment, so they all use __slots__.
+"""
+
+from collections.abc import Iterator
+from itertools import chain
+
+# Just ones we typically care about:
+ORDERED_GROUPS = (
+    "WITH",
+    "SELECT",
+    "INTO",
+    "FROM",
+    "WHERE",
+    "TIMESERIES",
+    "GROUP BY",
+    "HAVING",
+    "MATCH",
+    "UNION",
+    "EXCEPT",
+    "INTERSECT",
+    "ORDER BY",
+    "LIMIT",
+    "OFFSET",
+    "FOR UPDATE",
+)
+
+# NATURAL [ INNER | LEFT OUTER | RIGHT OUTER | FULL OUTER ] JOIN right-join-table
+JOIN_STARTS = ("NATURAL", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "JOIN")
+
+# marks the states of CLAUSE_KEYWORDS that end a keyword (words are never None)
+ACCEPT = None
+
+
+def compile_clause_keywords() -> dict:
+    """All of the clause keywords, as an automaton over (upper cased) words:
+    each state is a dict from the next word to the next state,
+    and the states with ACCEPT in them end a keyword.
+    The ORDERED_GROUPS make up a trie,
+    and the joins loop: any run of JOIN_STARTS and OUTER, ending in JOIN.
+    Matching a keyword is then a dict lookup per word,
+    however many keywords there are."""
+    root = {}
+    for group in ORDERED_GROUPS:
+        state = root
+        for word in group.split(" "):
+            state = state.setdefault(word, {})
+        state[ACCEPT] = True
+    joins = {}
+    for word in JOIN_STARTS + ("OUTER",):
+        joins[word] = joins
+    joins["JOIN"] = {ACCEPT: True}
+    for word in JOIN_STARTS:
+        root[word] = joins[word]
+    return root
+
+
+CLAUSE_KEYWORDS = compile_clause_keywords()
+
+
+class Node:
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        slots = [x for cls in type(self).__mro__ for x in getattr(cls, "__slots__", ())]
+        return f"{type(self).__name__}({', '.join([f'{x}={getattr(self, x)!r}' for x in slots])})"
+
+
+class Comment(Node):
+    """The line comment at tokens[token]."""
+
+    __slots__ = ("token",)
+
+    def __init__(self, token: int):
+        self.token = token
+
+
+class TemplateBlock(Node):
+    """The {{ }}, {% %} or {# #} block at tokens[token]."""
+
+    __slots__ = ("token",)
+
+    def __init__(self, token: int):
+        self.token = token
+
+
+class Subquery(Node):
+    """A SELECT in parentheses: tokens[open] is the (, tokens[close] the ),
+    and statement is what's in between (see build_statement).
+    layout is (the options, the lines) once it's been laid out (see layout_subquery)."""
+
+    __slots__ = ("open", "close", "statement", "layout")
+
+    def __init__(self, open: int, close: int, statement: "Statement" = None):
+        self.open = open
+        self.close = close
+        self.statement = statement
+        self.layout = None
+
+
+class Expression(Node):
+    """tokens[start:end], followed by an optional trailing Comment.
+    children are the TemplateBlock and Subquery nodes directly inside of it."""
+
+    __slots__ = ("start", "end", "comment", "children")
+
+    def __init__(self, start: int, end: int, comment: Comment, children: list):
+        self.start = start
+        self.end = end
+        self.comment = comment
+        self.children = children
+
+
+class CaseBranch(Node):
+    """One WHEN ... THEN ... (or the ELSE ...) of a Case: tokens[start:end], from its keyword.
+    comments are the Comments on their own lines before it,
+    comment is the one at the end of its last line,
+    and cases are the Cases nested in it (not counting ones in parentheses)."""
+
+    __slots__ = ("start", "end", "comments", "comment", "cases")
+
+    def __init__(self, start: int, end: int, comments: list, comment: Comment, cases: list):
+        self.start = start
+        self.end = end
+        self.comments = comments
+        self.comment = comment
+        self.cases = cases
+
+
+class Case(Expression):
+    """An expression that is a CASE ... END (and whatever follows, like an alias).
+    tokens[start:head] is the CASE and its operand (if it has one),
+    head_comment is a comment on the same line as them,
+    tokens[close] is the END,
+    and end_comments are the Comments on their own lines before the END."""
+
+    __slots__ = ("head", "head_comment", "branches", "close", "end_comments")
+
+    def __init__(
+        self,
+        start: int,
+        end: int,
+        comment: Comment,
+        children: list,
+        head: int,
+        head_comment: Comment,
+        branches: list,
+        close: int,
+        end_comments: list,
+    ):
+        super().__init__(start, end, comment, children)
+        self.head = head
+        self.head_comment = head_comment
+        self.branches = branches
+        self.close = close
+        self.end_comments = end_comments
+
+
+class Clause(Node):
+    """A clause keyword (e.g. "SELECT" or "LEFT JOIN"), the Comment on the keyword's line,
+    the items of the clause, and the Comments on their own lines at the end of it.
+    items are
+    the SELECT expressions or WITH queries (with Comments on their own lines between them),
+    the WHERE conditions (split on AND, with Comments on their own lines between them too),
+    or a single Expression with the whole body for all other clauses."""
+
+    __slots__ = ("keyword", "comment", "items", "end_comments")
+
+    def __init__(self, keyword: str, comment: Comment, items: list, end_comments: list):
+        self.keyword = keyword
+        self.comment = comment
+        self.items = items
+        self.end_comments = end_comments
+
+
+class Statement(Node):
+    """tokens[start:end] cut up into Clauses.
+    leading is whatever comes before the first clause (usually just Comments)."""
+
+    __slots__ = ("tokens", "start", "end", "leading", "clauses")
+
+    def __init__(self, tokens: list, start: int, end: int, leading: list, clauses: list):
+        self.tokens = tokens
+        self.start = start
+        self.end = end
+        self.leading = leading
+        self.clauses = clauses
+
+
+def match_clause_keyword(tokens: list, i: int) -> int:
+    """If tokens[i] starts one of the clause keywords
+    (`ORDERED_GROUPS`, or a join like `LEFT OUTER JOIN`),
+    return how many tokens the keyword takes up.
+    Otherwise, return 0.
+    Keywords are whole tokens, so `leftover_id` is never `LEFT`,
+    and LEFT on its own could just be the LEFT() function.
+    Right after a `.`, it's a name (like the column in `t.limit`), not a keyword."""
+    if i > 0 and tokens[i - 1].kind == "punct" and tokens[i - 1].text == ".":
+        return 0
+    state = CLAUSE_KEYWORDS
+    matched = 0
+    j = i
+    while j < len(tokens) and tokens[j].kind == "keyword":
+        state = state.get(tokens[j].text.upper())
+        if state is None:
+            break
+        j += 1
+        if ACCEPT in state:
+            matched = j - i
+    return matched
+
+
+def build_expression(tokens: list, start: int, end: int) -> Expression:
+    """An Expression for tokens[start:end],
+    splitting off a comment at the end of its last line.
+    (A comment on a line of its own at the end stays a part of it, on its own line.
+    See build_item, to pull those out as Comments instead.)"""
+    comment = None
+    if end - start > 1 and tokens[end - 1].kind == "comment" and tokens[end - 1].newlines == 0:
+        end -= 1
+        comment = Comment(end)
+    children = []
+    i = start
+    while i < end:
+        token = tokens[i]
+        if token.kind == "template":
+            children.append(TemplateBlock(i))
+        elif token.kind == "open":
+            # (whatever comments come before its first keyword)
+            j = i + 1
+            while j < i + token.pair and tokens[j].kind in ("comment", "block_comment"):
+                j += 1
+            if tokens[j].text.upper() in ("SELECT", "WITH"):
+                children.append(Subquery(i, i + token.pair))
+            i += token.pair
+        i += 1
+    if tokens[start].kind == "keyword" and tokens[start].text.upper() == "CASE":
+        case = build_case(tokens, start, end)
+        # the expression goes on past the END (e.g. an alias)
+        case.end, case.comment, case.children = end, comment, children
+        return case
+    return Expression(start, end, comment, children)
+
+
+def build_item(tokens: list, start: int, end: int, items: list) -> None:
+    """Add an Expression for tokens[start:end] to items,
+    with the comments on their own lines before and after it as Comments of their own,
+    so they stay on their own lines, wherever the expression goes.
+    (Otherwise one on the line after the expression would end up at the end of its line,
+    like `x = 1  -- and z = 2` for a condition that's been commented out.)"""
+    while start < end and tokens[start].kind == "comment":
+        items.append(Comment(start))
+        start += 1
+    j = end
+    while j > start and tokens[j - 1].kind == "comment" and tokens[j - 1].newlines > 0:
+        j -= 1
+    if j > start:
+        items.append(build_expression(tokens, start, j))
+    items += [Comment(x) for x in range(j, end)]
+
+
+def split_comments(tokens: list, start: int, end: int) -> tuple:
+    """Pull the comments off of the end of tokens[start:end]:
+    returns where what's left ends,
+    the Comment at the end of its last line (or None),
+    and the Comments on their own lines after it."""
+    j = end
+    while j > start and tokens[j - 1].kind == "comment" and tokens[j - 1].newlines > 0:
+        j -= 1
+    own_lines = [Comment(x) for x in range(j, end)]
+    if j - 1 > start and tokens[j - 1].kind == "comment":
+        return j - 1, Comment(j - 1), own_lines
+    return j, None, own_lines
+
+
+def build_case(tokens: list, start: int, end: int) -> Case:
+    """Parse the CASE at tokens[start], up to its END (looking no further than `end`).
+    The Case ends right after the END: build_expression extends it to the whole expression.
+    CASEs nested in the branches get parsed along the way, recursively,
+    so every token is looked at once."""
+    head, head_comment = None, None
+    branches = []
+    # the Comments on their own lines waiting for the next branch
+    comments = []
+    # where the branch we're in started, and the Cases nested in it
+    first = start + 1
+    cases = []
+    i = start + 1
+    while i < end:
+        token = tokens[i]
+        if token.kind == "open":
+            # a CASE in parentheses is just part of the expression
+            i += token.pair + 1
+            continue
+        word = token.text.upper() if token.kind == "keyword" else None
+        if word == "CASE":
+            cases.append(nested := build_case(tokens, i, end))
+            i = nested.end
+            continue
+        if word in ("WHEN", "ELSE", "END"):
+            if head is None:
+                # from the CASE itself, so a comment right after it counts as on its line
+                head, head_comment, comments = split_comments(tokens, start, i)
+            else:
+                j, comment, own_lines = split_comments(tokens, first, i)
+                branches.append(CaseBranch(first, j, comments, comment, cases))
+                comments = own_lines
+            if word == "END":
+                return Case(start, i + 1, None, [], head, head_comment, branches, i, comments)
+            first = i
+            cases = []
+        i += 1
+    raise RuntimeError("CASE without an END")
+
+
+def build_select_items(tokens: list, start: int, end: int) -> list:
+    """Split a SELECT body into its expressions, at the top level commas.
+    A comment on its own line between expressions is an item of its own
+    (whichever side of the comma it's on).
+    A comment at the end of an expression's last line, or right after its comma,
+    belongs to the expression."""
+    items = []
+    # where the expression we're reading starts
+    first = None
+    i = start
+    while i < end:
+        token = tokens[i]
+        if token.kind == "comment" and first is None:
+            if token.newlines == 0 and len(items) > 0 and isinstance(items[-1], Expression):
+                # a comment right after the comma of the previous expression
+                if items[-1].comment is not None:
+                    raise RuntimeError("Found double comments on expression - shouldnt happen")
+                items[-1].comment = Comment(i)
+            else:
+                items.append(Comment(i))
+        elif token.kind == "open":
+            # jump straight over the group to its close
+            if first is None:
+                first = i
+            i += token.pair
+        elif token.text == ",":
+            if first is not None:
+                build_item(tokens, first, i, items)
+            first = None
+        elif first is None:
+            first = i
+        i += 1
+    if first is not None:
+        build_item(tokens, first, end, items)
+    return items
+
+
+def build_conditions(tokens: list, start: int, end: int) -> list:
+    """Split a WHERE body on the top level ANDs,
+    leaving alone the AND in `x BETWEEN 1 AND 10`, and the ones inside of a CASE.
+    Comments on their own lines between conditions are items of their own."""
+    items = []
+    first = start
+    between = False
+    i = start
+    while i < end:
+        token = tokens[i]
+        if token.kind == "open":
+            # jump over the whole group
+            i += token.pair
+        elif token.kind == "keyword" and token.text.upper() == "CASE":
+            # and over the whole CASE, up to its END
+            i = build_case(tokens, i, end).end
+            continue
+        elif token.kind == "keyword":
+            if token.text.upper() == "BETWEEN":
+                between = True
+            elif token.text.upper() == "AND":
+                if not between:
+                    build_item(tokens, first, i, items)
+                    first = i + 1
+                between = False
+        i += 1
+    build_item(tokens, first, end, items)
+    return items
+
+
+def build_leading(tokens: list, start: int, end: int) -> list:
+    """Whatever comes before the first clause:
+    Comments, and Expressions for the runs of anything else in between them."""
+    items = []
+    first = start
+    for i in range(start, end):
+        if tokens[i].kind == "comment":
+            if i > first:
+                items.append(build_expression(tokens, first, i))
+            items.append(Comment(i))
+            first = i + 1
+    if end > first:
+        items.append(build_expression(tokens, first, end))
+    return items
+
+
+def iter_subqueries(statement: Statement) -> Iterator:
+    """The Subqueries directly in the expressions of a Statement (not the ones inside of those)."""
+    for item in chain(statement.leading, *[clause.items for clause in statement.clauses]):
+        if isinstance(item, Expression):
+            for child in item.children:
+                if isinstance(child, Subquery):
+                    yield child
+
+
+def build_statement(tokens: list, start: int = 0, end: int = None) -> Statement:
+    """Parse tokens[start:end] into a Statement,
+    with the statements of the subqueries in it (however deep they go, without recursing)."""
+    statement = build_clauses(tokens, start, end)
+    pending = [statement]
+    while len(pending) > 0:
+        for subquery in iter_subqueries(pending.pop()):
+            subquery.statement = build_clauses(tokens, subquery.open + 1, subquery.close)
+            pending.append(subquery.statement)
+    return statement
+
+
+def build_clauses(tokens: list, start: int = 0, end: int = None) -> Statement:
+    """Parse tokens[start:end] into a Statement,
+    by cutting it up at the top level clause keywords
+    (leaving the statements of its subqueries to build_statement)."""
+    if end is None:
+        end = len(tokens)
+    # (keyword, where the keyword starts, comment, where the body starts) for each clause
+    clauses = []
+    i = start
+    while i < end:
+        token = tokens[i]
+        if token.kind == "open":
+            # nothing inside of a group starts a clause, jump over it
+            i += token.pair + 1
+            continue
+        if token.kind == "keyword" and (n := match_clause_keyword(tokens, i)):
+            keyword_start = i
+            keyword = " ".join([x.text.upper() for x in tokens[i : i + n]])
+            i += n
+            comment = None
+            if i < end and tokens[i].kind == "comment" and tokens[i].newlines == 0:
+                comment = Comment(i)
+                i += 1
+            clauses.append((keyword, keyword_start, comment, i))
+            continue
+        i += 1
+
+    leading_end = clauses[0][1] if len(clauses) > 0 else end
+    statement = Statement(tokens, start, end, build_leading(tokens, start, leading_end), [])
+    for n, (keyword, _, comment, body_start) in enumerate(clauses):
+        # the body runs up to the next clause keyword
+        body_end = clauses[n + 1][1] if n + 1 < len(clauses) else end
+        # pull the comments on their own lines off of the end
+        j = body_end
+        while j > body_start and tokens[j - 1].kind == "comment" and tokens[j - 1].newlines > 0:
+            j -= 1
+        end_comments = [Comment(x) for x in range(j, body_end)]
+        if keyword in ("SELECT", "WITH"):
+            # the common table expressions of a WITH are split up just like SELECT expressions
+            items = build_select_items(tokens, body_start, j)
+        elif keyword == "WHERE":
+            items = build_conditions(tokens, body_start, j)
+        elif j > body_start:
+            items = [build_expression(tokens, body_start, j)]
+        else:
+            items = []
+        statement.clauses.append(Clause(keyword, comment, items, end_comments))
+    return statement
@@ -0,0 +1,271 @@
+"""Checking that SQL is already formatted, without formatting it.
+
+Most of what `brown --check` sees has been formatted already,
+and formatting it again just to compare the text is mostly wasted work:
+describing the layout and printing it is around half of the time.
+Instead, `verify_formatted` tokenizes the text once, builds the tree,
+and walks the clauses, checking every gap between two tokens against
+what the layout would put there (a line break and the indent, one space,
+two before a trailing comment, nothing before a comma, ...)
+and the tokens themselves (upper case clause keywords, comment spacing).
+Whether a clause goes on one line or gets broken up is worked out
+from the widths of the tokens, the same way the layout decides it.
+Nothing gets built or printed.
+
+It only knows the simple layouts:
+SELECT, WHERE and all the other clauses of plain expressions, with comments around them.
+On anything else (CASE in a SELECT or WHERE, subqueries, WITH, comments inside of an expression,
+strings over several lines, ...) it gives up,
+so `is_formatted` falls back on formatting the text and comparing.
+Either way the answer is exactly whether format_str(sql) == sql.
+"""
+
+from . import comment_text, format_str, render_token
+from .lexer import tokenize
+from .tree import Case, Comment, Subquery, build_statement
+
+
+class Unformatted(Exception):
+    """The text doesn't look like formatted SQL (or we can't tell)."""
+
+
+class Verifier:
+    """Walks the tokens of a script in order (self.i is the next one),
+    checking each against where the formatter would put it."""
+
+    __slots__ = ("text", "tokens", "line_length", "indent", "i", "line_break")
+
+    def __init__(self, text: str, tokens: list, line_length: int, indent: str):
+        self.text = text
+        self.tokens = tokens
+        self.line_length = line_length
+        self.indent = indent
+        self.i = 0
+        # what goes before the next line that starts at column 0
+        # (nothing at the start of the file, a blank line between statements)
+        self.line_break = ""
+
+    def next_line(self) -> str:
+        line_break, self.line_break = self.line_break, "\n"
+        return line_break
+
+    def take(self, gap: str, text: str = None) -> int:
+        """Check that the next token comes after `gap` (and is `text`, if given),
+        and move on to the one after it."""
+        if self.i >= len(self.tokens):
+            raise Unformatted("ran out of tokens")
+        token = self.tokens[self.i]
+        before = self.tokens[self.i - 1].end if self.i > 0 else 0
+        if self.text[before : token.start] != gap or (text is not None and token.text != text):
+            raise Unformatted(f"at offset {token.start}")
+        self.i += 1
+        return self.i - 1
+
+    def comment(self, comment: Comment, gap: str) -> None:
+        """A comment on a line of its own."""
+        if self.i != comment.token:
+            raise Unformatted("comment out of place")
+        self.take(gap, "-- " + comment_text(self.tokens[comment.token]))
+
+    def suffix(self, comment: Comment) -> None:
+        """A comment at the end of a line."""
+        if comment is not None:
+            self.comment(comment, "  ")
+
+    def suffix_width(self, comment: Comment) -> int:
+        if comment is None:
+            return 0
+        return len("  -- ") + len(comment_text(self.tokens[comment.token]))
+
+    def width(self, expression) -> int:
+        """The width of an expression on one line,
+        if it's written the way render would put it back together
+        (and if it isn't, checking it will fail anyway)."""
+        return self.tokens[expression.end - 1].end - self.tokens[expression.start].start
+
+    def expression(self, expression, gap: str, case: bool = False) -> None:
+        """An expression that's rendered as it is, on one line.
+        A CASE is only rendered like that if `case`."""
+        if isinstance(expression, Case) and not case:
+            raise Unformatted("CASE")
+        if not case and any([isinstance(x, Subquery) for x in expression.children]):
+            raise Unformatted("subquery")
+        if self.i != expression.start:
+            raise Unformatted("expression out of place")
+        for k in range(expression.start, expression.end):
+            token = self.tokens[k]
+            if token.kind == "comment" or "\n" in token.text or render_token(token) != token.text:
+                raise Unformatted(f"at offset {token.start}")
+            if k == expression.start:
+                self.take(gap)
+                continue
+            # see separator()
+            previous = self.tokens[k - 1]
+            space = self.text[previous.end : token.start]
+            if space != "" and (space != " " or previous.kind == "open" or token.kind == "close"):
+                raise Unformatted(f"at offset {token.start}")
+            self.i += 1
+
+    def keyword(self, keyword: str) -> None:
+        for n, word in enumerate(keyword.split(" ")):
+            self.take(self.next_line() if n == 0 else " ", word)
+
+    def select(self, clause) -> None:
+        """See process_select."""
+        items = clause.items
+        width = len(clause.keyword) + self.suffix_width(clause.comment) + len(items) - 1
+        broken = False
+        for item in items:
+            if isinstance(item, Comment):
+                broken = True
+            else:
+                width += 1 + self.width(item) + self.suffix_width(item.comment)
+        line = "\n" + self.indent
+        if not broken and width <= self.line_length:
+            # all on one line, with the comments at the end of it
+            # (so there can only be one, or it'd be in a different place)
+            if clause.comment is not None:
+                raise Unformatted("comment out of place")
+            line = " "
+        self.suffix(clause.comment)
+        for n, item in enumerate(items):
+            if isinstance(item, Comment):
+                self.comment(item, line)
+                continue
+            self.expression(item, line)
+            if n < len(items) - 1:
+                self.take("", ",")
+                if line == " " and item.comment is not None:
+                    raise Unformatted("comment out of place")
+            self.suffix(item.comment)
+
+    def where(self, clause) -> None:
+        """See process_where."""
+        items = clause.items
+        width = len(clause.keyword) + self.suffix_width(clause.comment)
+        broken = False
+        conditions = 0
+        for n, item in enumerate(items):
+            if isinstance(item, Comment):
+                broken = True
+                continue
+            width += len(" AND " if conditions > 0 else " ") + self.width(item)
+            width += self.suffix_width(item.comment)
+            broken = broken or (item.comment is not None and n < len(items) - 1)
+            conditions += 1
+        line = "\n" + self.indent
+        if not broken and width <= self.line_length:
+            if clause.comment is not None:
+                raise Unformatted("comment out of place")
+            line = " "
+        self.suffix(clause.comment)
+        conditions = 0
+        for item in items:
+            if isinstance(item, Comment):
+                self.comment(item, line)
+                continue
+            if conditions > 0:
+                self.take(line, "AND")
+            self.expression(item, line if conditions == 0 else " ")
+            self.suffix(item.comment)
+            conditions += 1
+
+    def other(self, clause) -> None:
+        """FROM, joins and everything else, see process_from."""
+        if len(clause.items) == 0:
+            self.suffix(clause.comment)
+            return
+        expression = clause.items[0]
+        width = len(clause.keyword) + 1 + self.width(expression)
+        width += self.suffix_width(clause.comment) + self.suffix_width(expression.comment)
+        if width <= self.line_length:
+            if clause.comment is not None:
+                raise Unformatted("comment out of place")
+            self.expression(expression, " ", case=isinstance(expression, Case))
+            self.suffix(expression.comment)
+        else:
+            # the comments all go at the end of the keyword's line
+            if expression.comment is not None:
+                raise Unformatted("comment out of place")
+            self.suffix(clause.comment)
+            self.expression(expression, "\n" + self.indent, case=isinstance(expression, Case))
+
+    def statement(self, start: int, end: int) -> None:
+        """See parse."""
+        statement = build_statement(self.tokens, start, end)
+        for item in statement.leading:
+            if not isinstance(item, Comment) or self.i != item.token:
+                raise Unformatted("something before the first clause")
+            self.take(self.next_line(), render_token(self.tokens[item.token]))
+        for clause in statement.clauses:
+            if clause.keyword in ("WITH", "INTO"):
+                raise Unformatted(clause.keyword)
+            self.keyword(clause.keyword)
+            if clause.keyword == "SELECT":
+                self.select(clause)
+            elif clause.keyword == "WHERE":
+                self.where(clause)
+            else:
+                self.other(clause)
+            for comment in clause.end_comments:
+                self.comment(comment, self.next_line())
+        if self.i != end:
+            raise Unformatted("tokens left over")
+
+    def statements(self) -> list:
+        """The (start, end) of the statements in the tokens,
+        cut up just like iter_statements cuts up the text."""
+        tokens = self.tokens
+        statements = []
+        start = 0
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token.kind == "open":
+                i += token.pair
+            elif token.kind == "punct" and token.text == ";":
+                end = i + 1
+                # a comment on the same line goes with it
+                if (
+                    end < len(tokens)
+                    and tokens[end].kind == "comment"
+                    and tokens[end].newlines == 0
+                ):
+                    end += 1
+                statements.append((start, end))
+                start = i = end
+                continue
+            i += 1
+        if start < len(tokens):
+            statements.append((start, len(tokens)))
+        return statements
+
+    def script(self) -> None:
+        for start, end in self.statements():
+            self.statement(start, end)
+            # and a blank line between statements
+            self.line_break = "\n\n"
+        if self.text[self.tokens[-1].end :] != "\n":
+            raise Unformatted("not one newline at the end")
+
+
+def verify_formatted(sql: str, line_length: int = 100, indent: str = " " * 4) -> bool:
+    """True if sql is certainly formatted already (format_str would give back the same text),
+    False if it's not, or if we can't tell without formatting it."""
+    try:
+        tokens = tokenize(sql)
+        if len(tokens) == 0:
+            return sql == ""
+        Verifier(sql, tokens, line_length, indent).script()
+    except (Unformatted, RuntimeError):
+        return False
+    return True
+
+
+def is_formatted(sql: str, *, line_length: int = 100, indent: str = " " * 4) -> bool:
+    """Whether format_str(sql) == sql,
+    without formatting it if verify_formatted can tell.
+    Raises like format_str if it can't be formatted."""
+    if verify_formatted(sql, line_length, indent):
+        return True
+    return format_str(sql, line_length=line_length, indent=indent) == sql
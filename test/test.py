@@ -1,13 +1,65 @@
+import contextlib
+import http.client
+import io
+import logging
+import math
 import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+import unittest.mock
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
 
 from .brown import (
+    LayoutCache,
+    __version__,
     detect_substatement_type,
+    expression_cache,
+    format_bytes,
+    format_str,
+    format_stream,
     indent_case_statement,
     indent_case_statement_iterative,
     parse,
     scan_to_close,
+    subquery_cache,
+    write_stream,
+)
+from .brown.cache import get_cache_prefix
+from .brown.cli import find_sql_files, main
+from .brown.daemon import format_text, make_server
+from .brown.layout import (
+    BREAK_PARENT,
+    HARDLINE,
+    LINE,
+    SOFTLINE,
+    Dedent,
+    Group,
+    LineSuffix,
+    Nest,
+    join,
+    measure,
+    pretty,
 )
+from .brown.lexer import iter_statements, split_script, tokenize
+from .brown.prescan import split_statements
+from .brown.profiling import Profile
+from .brown.tree import build_statement, match_clause_keyword
+from .brown.verify import is_formatted, verify_formatted
+
+# seconds: test_import_time mostly checks what gets imported, which is what makes it slow.
+# This only catches something gross (it's around 10ms, but shared machines can be slow)
+IMPORT_TIME_BUDGET = 0.2
+# test_scaling fails on anything that grows faster than about n log n:
+# n log n from n to 8n fits an exponent of 1.1 or so, and quadratic is 2
+SCALING_MAX_EXPONENT = 1.35
 
 
 def test_scan_to_close(**kwargs) -> None:
@@ -23,6 +75,243 @@ def test_scan_to_close(**kwargs) -> None:
     assert scan_to_close("(z(x(a)1)2)3)", **kwargs) == "(z(x(a)1)2)3"
 
 
+def test_tokenize() -> None:
+    tokens = tokenize("select a,-- hi\n  {{ ref('x') }} from t left join leftover_id")
+    assert [x.kind for x in tokens] == [
+        "keyword",
+        "name",
+        "punct",
+        "comment",
+        "template",
+        "keyword",
+        "name",
+        "keyword",
+        "keyword",
+        "name",
+    ]
+    # comments on the same line vs. on their own line
+    assert tokens[3].newlines == 0
+    assert tokens[4].newlines == 1
+    # offsets point back into the source
+    assert tokens[4].text == "{{ ref('x') }}"
+    assert tokens[4].start == 17
+    # strings and comments hide their contents
+    assert [x.kind for x in tokenize("'it''s -- not a comment'")] == ["string"]
+    assert [x.kind for x in tokenize("-- 'not a string\n")] == ["comment"]
+
+    # brackets are matched up as we go
+    tokens = tokenize("f(a, (b)) c")
+    assert [x.pair for x in tokens] == [0, 6, 0, 0, 2, 0, -2, -6, 0]
+    with unittest.TestCase().assertRaisesRegex(RuntimeError, "line 2, column 3"):
+        tokenize("select\n  (a")
+    with unittest.TestCase().assertRaisesRegex(RuntimeError, "line 1, column 9"):
+        tokenize("select a) from t")
+    with unittest.TestCase().assertRaisesRegex(RuntimeError, "line 2, column 1"):
+        tokenize("select\n{{ ref('x') from t")
+
+
+def test_process_select() -> None:
+    # flat as long as it fits exactly
+    assert parse("select a, b, c from t", line_length=14) == "SELECT a, b, c\nFROM t\n"
+    assert (
+        parse("select a, b, c from t", line_length=13) == "SELECT\n    a,\n    b,\n    c\nFROM t\n"
+    )
+    assert parse("select a, b -- on b\nfrom t") == "SELECT a, b  -- on b\nFROM t\n"
+    # a comment inside of an expression means it can't go on one line
+    raw = "select a, case when x then 1 -- one\nelse 2 end b from t"
+    assert parse(raw).startswith("SELECT\n    a,\n    CASE\n        WHEN x THEN 1  -- one\n")
+    # comments after the comma go with the expression before it,
+    # comments on their own line stay on their own line
+    raw = "select a, -- on a\n b, -- on b\n -- own line\n c -- on c\nfrom t"
+    assert (
+        parse(raw)
+        == """SELECT
+    a,  -- on a
+    b,  -- on b
+    -- own line
+    c  -- on c
+FROM t
+"""
+    )
+
+
+def test_subquery() -> None:
+    raw = """with a as (select x from t where x > 1), -- on a
+b as (select * from a)
+select a.x, (select max(x) from b) m
+from a left join (select   id from u) u on a.x = u.id
+where a.x in (select x from b) and y"""
+    expected = """WITH a as (
+    SELECT x
+    FROM t
+    WHERE x > 1
+),  -- on a
+b as (
+    SELECT *
+    FROM a
+)
+SELECT
+    a.x,
+    (
+        SELECT max(x)
+        FROM b
+    ) m
+FROM a
+LEFT JOIN (
+    SELECT id
+    FROM u
+) u on a.x = u.id
+WHERE
+    a.x in (
+        SELECT x
+        FROM b
+    )
+    AND y
+"""
+    assert parse(raw) == expected
+    # nested ones are indented further, and the lines still fit
+    raw = "select a from (select a, b from (select a, b, c from t) x) y"
+    assert (
+        parse(raw, line_length=21)
+        == """SELECT a
+FROM (
+    SELECT a, b
+    FROM (
+        SELECT
+            a,
+            b,
+            c
+        FROM t
+    ) x
+) y
+"""
+    )
+    assert parse("select a from t", starting_indent="  ") == "  SELECT a\n  FROM t\n"
+    # the same subquery (give or take whitespace) is only formatted once
+    subquery_cache.cache_clear()
+    parse("select a from (select 1 from t) x, (select  1\nfrom t) y")
+    assert subquery_cache.cache_info().hits == 1
+    # not something we can format
+    assert parse("select a from (select 1; ) x") == "SELECT a\nFROM (select 1;) x\n"
+    # comments on a clause with a subquery go at the end of its last line, not inside of it
+    raw = "select a from (select b from u) x -- note\nwhere y"
+    expected = "SELECT a\nFROM (\n    SELECT b\n    FROM u\n) x  -- note\nWHERE y\n"
+    assert parse(raw) == expected and parse(expected) == expected
+    raw = "select a from -- note\n(select b from u) x"
+    assert parse(raw) == expected.replace("WHERE y\n", "")
+    # and comments before the SELECT of a subquery stay in it
+    raw = "select a from ( -- c\nselect b from u) x"
+    expected = "SELECT a\nFROM (\n    -- c\n    SELECT b\n    FROM u\n) x\n"
+    assert parse(raw) == expected and parse(expected) == expected
+    # however deep they go
+    n = 250
+    raw = "select a from " + "(select a from " * n + "t" + ") x" * n
+    formatted = parse(raw)
+    assert formatted.count(") x\n") == n
+    assert parse(formatted) == formatted
+
+
+def test_expression_cache() -> None:
+    expression_cache.cache_clear()
+    raw = "select case when x = 1 then 'a' else 'b' end as y from t"
+    first = parse(raw, line_length=30)
+    # the same CASE, give or take whitespace and upper case keywords
+    assert parse(raw.replace("case when", "CASE\n  when"), line_length=30) == first
+    assert expression_cache.cache_info()[:2] == (1, 1)
+    # but not with other options
+    parse(raw, line_length=31)
+    assert expression_cache.cache_info()[:2] == (1, 2)
+    assert indent_case_statement(raw[7:-7], " " * 4, " " * 4, 30) == first.split("\n", 1)[1][4:-8]
+    assert expression_cache.cache_info()[:2] == (2, 2)
+    # least recently used goes first
+    cache = LayoutCache(2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert cache.get("b") is None and cache.get("a") == "1"
+    assert cache.cache_info() == (2, 1, 2, 2)
+
+
+def test_layout() -> None:
+    items = Group(["f(", Nest("  ", [SOFTLINE, join([",", LINE], ["a", "b", "c"])]), SOFTLINE, ")"])
+    assert pretty(items, 10) == "f(a, b, c)"
+    assert pretty(items, 9) == "f(\n  a,\n  b,\n  c\n)"
+    # an inner group gets its own chance to fit once the outer one is broken
+    doc = Group(["x", Nest("  ", [LINE, Group(["y", LINE, "z"]), LINE, "w"])])
+    assert pretty(doc, 6) == "x\n  y z\n  w"
+    assert pretty(doc, 3) == "x\n  y\n  z\n  w"
+    # line suffixes wait for the end of the line, and count towards the width
+    doc = Group(["a", LineSuffix("  -- c"), LINE, "b"])
+    assert pretty(doc, 9) == "a b  -- c"
+    assert pretty(doc, 8) == "a  -- c\nb"
+    # nothing around a hard line break fits, and empty lines get no indent
+    doc = Group(["a", Nest("  ", [LINE, "b", HARDLINE, HARDLINE, "c"])])
+    assert pretty(doc, 100) == "a\n  b\n\n  c"
+    assert pretty(Group(["a", LINE, "b", BREAK_PARENT]), 100) == "a\nb"
+    # text that comes indented already doesn't get indented again
+    doc = ["(", Nest("  ", [Dedent([HARDLINE, " x"]), HARDLINE, ")"])]
+    assert pretty(doc, 100) == "(\n x\n  )"
+    # or straight into a file, a line at a time
+    out = unittest.mock.Mock()
+    assert pretty(Group(["a", Nest("  ", [HARDLINE, "b"])]), 100, out=out) is None
+    assert [x.args for x in out.write.call_args_list] == [("a\n",), ("  b",)]
+    # widths get measured once
+    group = Group(["a", LINE, "b"])
+    assert measure([group, "cd"]) == 5 and group.width == 3
+
+
+def test_build_statement() -> None:
+    raw = """-- lead
+select a, -- on a
+    -- own line
+    case when x then 1 end as b,
+    (select 1) c
+from t  -- on t
+where x between 1 and 2 and y
+-- after
+"""
+    tokens = tokenize(raw)
+    statement = build_statement(tokens)
+    assert [type(x).__name__ for x in statement.leading] == ["Comment"]
+    assert [x.keyword for x in statement.clauses] == ["SELECT", "FROM", "WHERE"]
+    select, from_, where = statement.clauses
+    assert [type(x).__name__ for x in select.items] == [
+        "Expression",
+        "Comment",
+        "Case",
+        "Expression",
+    ]
+    assert tokens[select.items[0].comment.token].text == "-- on a"
+    case = select.items[2]
+    assert [tokens[x.start].text for x in case.branches] == ["when"]
+    assert tokens[case.close].text == "end" and tokens[case.end - 1].text == "b"
+    # nodes point at tokens, they don't hold text
+    subquery = select.items[3].children[0]
+    assert tokens[subquery.open].text == "(" and tokens[subquery.close].text == ")"
+    assert subquery.statement.clauses[0].keyword == "SELECT"
+    assert tokens[from_.items[0].comment.token].text == "-- on t"
+    assert len(where.items) == 2
+    assert [tokens[x.token].text for x in where.end_comments] == ["-- after"]
+    assert not hasattr(select, "__dict__")
+
+
+def test_match_clause_keyword() -> None:
+    tokens = tokenize("group by left outer join join order leftover_id left(x) for update")
+    assert [match_clause_keyword(tokens, i) for i in range(len(tokens))] == [
+        *(2, 0),  # group by
+        *(3, 0, 1),  # left outer join (and the JOIN on its own)
+        1,  # join
+        *(0, 0),  # order (without by), leftover_id
+        *(0, 0, 0, 0),  # left(x)
+        *(2, 0),  # for update
+    ]
+    # a column that happens to be called like a keyword
+    tokens = tokenize("t.limit t. left join")
+    assert [match_clause_keyword(tokens, i) for i in range(len(tokens))] == [0, 0, 0, 0, 0, 0, 1]
+    assert parse("select t.limit, t.offset from t") == "SELECT t.limit, t.offset\nFROM t\n"
+
+
 # def test_get_trailing_comment() -> None:
 #     sanitized = """T-- comment
 # """
@@ -116,7 +405,7 @@ def test_indent_case_statement_iterative(**kwargs) -> None:
     print(raw)
     print(expected)
     print(parsed)
-    # assert expected == parsed
+    assert expected == parsed
 
     expected = """CASE
     WHEN x = 10 THEN 5
@@ -151,7 +440,7 @@ def test_indent_case_statement_iterative(**kwargs) -> None:
     print(raw)
     print(expected)
     print(parsed)
-    # assert expected == parsed
+    assert expected == parsed
 
     raw = """CASE
 -- leading case statement comment
@@ -197,6 +486,23 @@ AS q"""
     print(parsed)
     assert expected == parsed
 
+    # nested CASEs get laid out recursively, and comments in them are kept
+    raw = """case x when 1 then case when y then 2 -- two
+else 3 end when 2 then 4 end as z"""
+    expected = """CASE x
+    WHEN 1 THEN CASE
+        WHEN y THEN 2  -- two
+        ELSE 3
+        END
+    WHEN 2 THEN 4
+    END AS z"""
+    parsed = indent_case_statement_iterative(raw, " " * 4, " " * 4, 100, **kwargs)
+    assert expected == parsed
+    raw = "case when x then case when y then 1 end end"
+    assert indent_case_statement_iterative(raw, "", " " * 4, 100, **kwargs) == (
+        "CASE WHEN x THEN CASE WHEN y THEN 1 END END"
+    )
+
 
 def test_process_expression() -> None:
     # Test the inner-expression search for a trailing comment:
@@ -351,6 +657,580 @@ WHERE h AND k > 10
 """
     test_parse_wrapper(raw, expected, line_length=20, **kwargs)
 
+    # a comment at the end of a condition that isn't the last one ends its line,
+    # however short the WHERE is, or it'd comment out the rest
+    raw = """select a from t
+where x = 1 -- why
+and y = 2"""
+    expected = """SELECT a
+FROM t
+WHERE
+    x = 1  -- why
+    AND y = 2
+"""
+    test_parse_wrapper(raw, expected, **kwargs)
+    test_parse_wrapper(expected, expected, **kwargs)
+    # on the last one it can stay on the line
+    raw = """select a from t where x = 1 and y = 2 -- why"""
+    expected = """SELECT a
+FROM t
+WHERE x = 1 AND y = 2  -- why
+"""
+    test_parse_wrapper(raw, expected, **kwargs)
+
+    # comments on their own lines stay on their own lines,
+    # like a condition or a column that's been commented out
+    raw = """select a from t where x = 1
+-- and z = 2
+and y = 2"""
+    expected = """SELECT a
+FROM t
+WHERE
+    x = 1
+    -- and z = 2
+    AND y = 2
+"""
+    test_parse_wrapper(raw, expected, **kwargs)
+    test_parse_wrapper(expected, expected, **kwargs)
+    raw = """select a from t where x = 1 -- c1
+-- own
+and y = 2"""
+    expected = """SELECT a
+FROM t
+WHERE
+    x = 1  -- c1
+    -- own
+    AND y = 2
+"""
+    test_parse_wrapper(raw, expected, **kwargs)
+    test_parse_wrapper(expected, expected, **kwargs)
+    # a CASE in a WHERE is laid out just like in a SELECT
+    raw = "select a from t where x = 1 and case when y = 1 then true else false end and z"
+    expected = """SELECT a
+FROM t
+WHERE x = 1 AND CASE WHEN y = 1 THEN true ELSE false END AND z
+"""
+    test_parse_wrapper(raw, expected, **kwargs)
+    expected = """SELECT a
+FROM t
+WHERE
+    x = 1
+    AND CASE
+        WHEN y = 1 THEN true
+        ELSE false
+        END
+    AND z
+"""
+    test_parse_wrapper(raw, expected, line_length=40, **kwargs)
+    test_parse_wrapper(expected, expected, line_length=40, **kwargs)
+    # the ANDs inside of a CASE don't split it up
+    raw = "select a from t where case when x and y then 1 else 0 end = 1 and z"
+    expected = """SELECT a
+FROM t
+WHERE CASE WHEN x and y THEN 1 ELSE 0 END = 1 AND z
+"""
+    test_parse_wrapper(raw, expected, **kwargs)
+    test_parse_wrapper(expected, expected, **kwargs)
+    raw = """select a
+-- , dropped
+, b from t"""
+    expected = """SELECT
+    a,
+    -- , dropped
+    b
+FROM t
+"""
+    test_parse_wrapper(raw, expected, **kwargs)
+    test_parse_wrapper(expected, expected, **kwargs)
+
+
+def test_format_stream() -> None:
+    raw = """-- script
+select a,b from t where x and y; -- first
+select 'a;b' c from (select 1; ) u;
+select 2"""
+    expected = """-- script
+SELECT a, b
+FROM t
+WHERE x AND y;  -- first
+
+SELECT 'a;b' c
+FROM (select 1;) u;
+
+SELECT 2
+"""
+    assert "".join(format_stream([raw])) == expected
+    # chunks can split anything (strings, comments, keywords)
+    for n in range(1, 10):
+        chunks = [raw[i : i + n] for i in range(0, len(raw), n)]
+        assert list(iter_statements(chunks)) == list(iter_statements([raw]))
+        assert "".join(format_stream(chunks)) == expected
+    out = io.StringIO()
+    write_stream([raw], out)
+    assert out.getvalue() == expected
+    # output comes out a statement at a time
+    stream = format_stream(iter(raw.splitlines(keepends=True)))
+    assert next(stream) == "-- script\nSELECT a, b\nFROM t\nWHERE x AND y;  -- first\n"
+
+
+def test_split_statements() -> None:
+    # without NumPy, the pre-scan leaves it to iter_statements
+    prescan = sys.modules[split_statements.__module__]
+    with unittest.mock.patch.object(prescan, "load_numpy", lambda: None):
+        assert split_statements("select 1; select 2") is None
+        assert list(split_script("select 1; select 2")) == ["select 1; ", "select 2"]
+    # and with it, it cuts scripts up exactly like iter_statements
+    pytest.importorskip("numpy")
+    scripts = [
+        "",
+        "select 1; select 2",
+        "select ';' a; -- c\nselect (1;2) b ;  \n select 3 /* ; */;{{ x(';') }};",
+        "select 'it''s; ok' \"a;\"\"\" from t; x; -- trailing\n\n  ",
+        "select 'é;' ;\tz; {% if x %}; {# ; #}",
+        # never closed
+        "select 1; select 'a; b",
+        "select 1;  {{ a; b",
+        # a ) without a (
+        "select 1); select 2",
+    ]
+    lexer = sys.modules[tokenize.__module__]
+    for raw in scripts:
+        expected = list(iter_statements([raw]))
+        statements = split_statements(raw)
+        # (None on the ones it leaves to iter_statements)
+        if "1)" not in raw:
+            assert statements == expected
+        with unittest.mock.patch.object(lexer, "PRESCAN_MIN_SIZE", 0):
+            assert list(split_script(raw)) == expected
+
+
+def test_format_stream_parallel() -> None:
+    raw = "".join([f"select a{i}, b from t{i} where x = {i} and y -- {i}\n;\n" for i in range(200)])
+    expected = "".join(format_stream([raw]))
+    module = sys.modules[parse.__module__]
+    # small inputs stay in this process
+    with unittest.mock.patch("concurrent.futures.ProcessPoolExecutor") as pool:
+        assert "".join(format_stream([raw], workers=2)) == expected
+        assert not pool.called
+    with unittest.mock.patch.multiple(module, PARALLEL_MIN_SIZE=1000, PARALLEL_BATCH_SIZE=500):
+        assert "".join(format_stream([raw], workers=2)) == expected
+        out = io.StringIO()
+        write_stream([raw], out, workers=2)
+        assert out.getvalue() == expected
+
+
+def test_trace() -> None:
+    raw = "select a, b from t where x and y"
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        parse(raw)
+    assert stdout.getvalue() == ""
+    logger = logging.getLogger(parse.__module__)
+    with unittest.TestCase().assertLogs(logger, logging.DEBUG) as logs:
+        parse(raw, debug=True)
+    assert any("found an expression" in x for x in logs.output)
+
+
+def test_import_time() -> None:
+    # importing the formatter shouldn't pull in the command line (click),
+    # or anything else beyond re, so it stays quick.
+    # Run in a fresh interpreter, best of a few
+    src = Path(sys.modules[parse.__module__].__file__).parent.parent
+    name = parse.__module__.rsplit(".", 1)[-1]
+    code = f"""
+import re, sys, time
+before = set(sys.modules)
+start = time.perf_counter()
+import {name}
+print(time.perf_counter() - start, *(set(sys.modules) - before))
+"""
+    times = []
+    for _ in range(3):
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=src, capture_output=True, text=True, check=True
+        ).stdout.split()
+        times.append(float(output[0]))
+        assert {x for x in output[1:] if x.split(".")[0] != name} <= {"collections.abc"}
+    assert min(times) < IMPORT_TIME_BUDGET
+
+
+def best_time(f, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def growth_exponent(f, inputs: list, repeat: int = 3) -> tuple:
+    """Time f on each of the inputs, and fit k in time ~ size ** k (least squares on a log-log plot).
+    The size is the text going in plus the text coming out,
+    since nothing can be quicker than that (deep nesting is quadratic in the indents alone).
+    Returns (k, [seconds])."""
+    sizes, times = [], []
+    for sql in inputs:
+        output = f(sql)
+        sizes.append(len(sql) + len(output))
+
+        def run():
+            # formatting the same thing again would only measure the caches
+            subquery_cache.cache_clear()
+            expression_cache.cache_clear()
+            f(sql)
+
+        times.append(best_time(run, repeat))
+    xs = [math.log(x) for x in sizes]
+    ys = [math.log(x) for x in times]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    slope = sum([(x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)])
+    return slope / sum([(x - mean_x) ** 2 for x in xs]), times
+
+
+def nested(n: int) -> str:
+    sql = "t"
+    for i in range(n):
+        sql = f"(select a, b from {sql} q{i} where a > {i})"
+    return f"select a from {sql} x"
+
+
+def test_scaling() -> None:
+    # formatting (and cutting up) generated SQL at sizes n, 2n, 4n and 8n
+    # shouldn't take more than about n log n: catch anything quadratic before it ships
+    scenarios = {
+        "wide select": (
+            lambda n: "select " + ", ".join([f"coalesce(c{i}, 0) as c{i}" for i in range(n)]),
+            200,
+        ),
+        "deep nesting": (nested, 5),
+        "deep parentheses": (lambda n: "select " + "(" * n + "a" + ")" * n + " from t", 200),
+        "long case": (
+            lambda n: "select case "
+            + " ".join([f"when c = {i} then 'l{i}'" for i in range(n)])
+            + " end x from t",
+            100,
+        ),
+        "many comments": (
+            lambda n: "select\n"
+            + "".join([f"    c{i},  -- on c{i}\n    -- above c{i + 1}\n" for i in range(n)])
+            + "    z\nfrom t",
+            100,
+        ),
+        "long in list": (
+            lambda n: "select a from t where a in ("
+            + ", ".join([f"'v{i}'" for i in range(n)])
+            + ") and b",
+            400,
+        ),
+        "long where": (
+            lambda n: "select a from t where " + " and ".join([f"c{i} > {i}" for i in range(n)]),
+            200,
+        ),
+        "many statements": (
+            lambda n: "".join([f"select a{i} from t{i} where x = {i};\n" for i in range(n)]),
+            100,
+        ),
+    }
+    for name, (generate, n) in scenarios.items():
+        inputs = [generate(n * x) for x in (1, 2, 4, 8)]
+        exponent, times = growth_exponent(format_str, inputs)
+        if exponent > SCALING_MAX_EXPONENT:
+            # timings are noisy, make sure
+            exponent, times = growth_exponent(format_str, inputs, repeat=7)
+        assert exponent <= SCALING_MAX_EXPONENT, (name, exponent, times)
+
+    # cutting a script into statements, on its own (it's not much of the time when formatting)
+    inputs = ["select 1;\n" * (5000 * x) for x in (1, 2, 4, 8)]
+    exponent, times = growth_exponent(lambda x: "".join(iter_statements([x])), inputs)
+    assert exponent <= SCALING_MAX_EXPONENT, ("iter_statements", exponent, times)
+    # and a long statement (with a long comment in it) arriving a line at a time, like `brown -`
+    inputs = [
+        "select\n"
+        + "".join([f"    c{i},  -- c{i}\n" for i in range(4000 * x)])
+        + "/*\n"
+        + "".join([f"    c{i}\n" for i in range(1000 * x)])
+        + "*/\n    z\nfrom t;\n"
+        for x in (1, 2, 4, 8)
+    ]
+
+    def split_lines(x):
+        return "".join(iter_statements(x.splitlines(keepends=True)))
+
+    exponent, times = growth_exponent(split_lines, inputs)
+    if exponent > SCALING_MAX_EXPONENT:
+        exponent, times = growth_exponent(split_lines, inputs, repeat=7)
+    assert exponent <= SCALING_MAX_EXPONENT, ("iter_statements in lines", exponent, times)
+
+
+def test_main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        runner = CliRunner(env={"BROWN_CACHE_DIR": str(root / "cache")})
+        (root / "models" / "nested").mkdir(parents=True)
+        (root / "models" / "a.sql").write_text("select a from t")
+        (root / "models" / "nested" / "b.sql").write_text("SELECT b\nFROM t\n")
+        (root / "models" / "nested" / "c.sql").write_text("select (a from t")
+        (root / "models" / "notes.txt").write_text("select a from t")
+        assert find_sql_files((str(root / "models"),)) == [
+            root / "models" / "a.sql",
+            root / "models" / "nested" / "b.sql",
+            root / "models" / "nested" / "c.sql",
+        ]
+        for workers in ["1", "2"]:
+            (root / "models" / "a.sql").write_text("select a from t")
+            result = runner.invoke(main, [str(root / "models"), "--workers", workers])
+            assert result.exit_code == 1
+            assert "1 file(s) changed, 1 unchanged, 1 failed." in result.output
+            assert (root / "models" / "a.sql").read_text() == "SELECT a\nFROM t\n"
+            assert (root / "models" / "notes.txt").read_text() == "select a from t"
+
+
+def test_format_str() -> None:
+    raw = "select a,b from t; select 1"
+    assert format_str(raw) == "SELECT a, b\nFROM t;\n\nSELECT 1\n"
+    assert (
+        format_str(raw, line_length=10, indent="  ") == "SELECT\n  a,\n  b\nFROM t;\n\nSELECT 1\n"
+    )
+    result = format_bytes(raw.encode())
+    assert result.output == format_str(raw).encode() and result.changed and result.error is None
+    assert result.seconds >= 0
+    assert not format_bytes(result.output).changed
+    # it doesn't raise, it says what went wrong
+    result = format_bytes(b"select (a")
+    assert result.output == b"select (a" and not result.changed
+    assert result.error.startswith("RuntimeError: Unbounded group")
+    assert format_bytes(b"select \xff").error.startswith("UnicodeDecodeError")
+
+    # brown - formats standard input to standard output
+    runner = CliRunner()
+    result = runner.invoke(main, ["-"], input=raw)
+    assert result.exit_code == 0 and result.output == format_str(raw)
+    result = runner.invoke(main, ["-", "--check"], input=raw)
+    assert result.exit_code == 1 and "would reformat -" in result.output
+    result = runner.invoke(main, ["-", "--check"], input=format_str(raw))
+    assert result.exit_code == 0 and result.output == ""
+    result = runner.invoke(main, ["-", "--diff"], input=raw)
+    assert result.exit_code == 0 and "+FROM t;" in result.output
+    result = runner.invoke(main, ["-"], input="select (a")
+    assert result.exit_code == 1 and "error: cannot format -" in result.output
+    # nothing is written out unless it all formats, not even the statements before the error
+    result = runner.invoke(main, ["-"], input="select a from t;\nselect (b from u")
+    assert result.exit_code == 1 and "error: cannot format -" in result.output
+    assert "SELECT" not in result.output
+    assert runner.invoke(main, ["-", "."]).exit_code == 2
+
+
+def test_verify_formatted() -> None:
+    # the fast path only ever says something is formatted if formatting it wouldn't change it:
+    # check it against formatting on a corpus of scripts, formatted at a few widths,
+    # and on every small edit of them we can think of
+    corpus = [
+        "",
+        "select 1",
+        "select a,b from t; select 1",
+        """-- leading
+select a, left(b, 2) as lb, {{ ref('x') }} c, count(*) n, ( a + b ) s -- on s
+from t left outer join u on t.id = u.id -- on u
+inner join v using (id)
+where a between 1 and 2 and b in ('x','y') -- on b
+and leftover_id > 3
+group by 1, 2
+order by 1 desc
+-- after
+limit 10""",
+        "select a, -- on a\n b, -- on b\n -- own line\n c -- on c\nfrom t -- on t\nwhere x -- x\n and y",
+        "select a from t where x = 1 and y;  -- done\nselect 2;",
+        "select a /* b */ from t order by x  -- c\nlimit 5",
+    ]
+    # and some it can't check, so they get formatted
+    unchecked = [
+        "select a, (select max(x) from y) m from t where x in (select 1) and y",
+        "select case when x then 1 else 2 end y from t",
+        "select a from t where case when a then b end = 1 and x",
+        "with a as (select 1) select * from a",
+        "select 'a\nb' from t",
+    ]
+    edits = ["", " ", "  ", "\n", "\n    ", ",", ";", " -- z", "\n-- z\n", "AND "]
+    accepted = 0
+    for raw in corpus + unchecked:
+        for line_length, indent in [(10, "  "), (40, "    "), (100, "    ")]:
+            formatted = format_str(raw, line_length=line_length, indent=indent)
+            candidates = {raw, formatted, formatted.lower(), formatted + "\n"}
+            for i in range(0, len(formatted), 5):
+                for edit in edits:
+                    candidates.add(formatted[:i] + edit + formatted[i + 1 :])
+                    candidates.add(formatted[:i] + edit + formatted[i:])
+            for sql in candidates:
+                if verify_formatted(sql, line_length, indent):
+                    accepted += 1
+                    assert format_str(sql, line_length=line_length, indent=indent) == sql
+            if raw in corpus:
+                assert verify_formatted(formatted, line_length, indent)
+    # and it does get to say so, a lot of the time
+    assert accepted > 500
+
+    assert is_formatted("SELECT a, b\nFROM t;\n\nSELECT 1\n")
+    assert not is_formatted("select a, b from t")
+    # what it can't check gets formatted
+    raw = format_str("select (select 1) a")
+    assert not verify_formatted(raw) and is_formatted(raw)
+    assert not is_formatted(raw, line_length=10)
+
+    # --check doesn't format files it can tell are formatted
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        runner = CliRunner(env={"BROWN_CACHE_DIR": str(root / "cache")})
+        (root / "a.sql").write_text(format_str("select a from t"))
+        module = sys.modules[find_sql_files.__module__]
+        with unittest.mock.patch.object(module, "format_statements_stream") as formatter:
+            result = runner.invoke(main, [str(root / "a.sql"), "--check", "--workers", "1"])
+            assert result.exit_code == 0 and not formatter.called
+        (root / "a.sql").write_text("select a from t")
+        result = runner.invoke(main, [str(root / "a.sql"), "--check", "--workers", "1"])
+        assert result.exit_code == 1 and "would reformat" in result.output
+
+
+def test_profile() -> None:
+    raw = "select a, (select b from u) c from t; select case when x then 1 end y from t"
+    subquery_cache.cache_clear()
+    expression_cache.cache_clear()
+    with Profile() as outer:
+        with Profile() as profile:
+            "".join(format_stream([raw]))
+        # the outer one is back once the inner one is done
+        parse("select 1")
+    assert profile.counts == {
+        "statements": 2,
+        "bytes": len(raw),
+        "tokens": len(tokenize(raw)),
+        "subqueries": 1,
+        "subqueries cached": 0,
+        "cases": 1,
+        "cases cached": 0,
+    }
+    assert all([profile.seconds[x] > 0 for x in ("split", "tokenize", "build", "layout")])
+    assert outer.counts["statements"] == 1
+    assert "tokenize" in profile.report() and "subqueries" not in profile.summary()
+
+    # subclasses get every measurement as it's made
+    class Hook(Profile):
+        __slots__ = ("phases",)
+
+        def __init__(self):
+            super().__init__()
+            self.phases = []
+
+        def record(self, phase: str, seconds: float) -> None:
+            self.phases.append(phase)
+
+    with Hook() as hook:
+        parse("select 1")
+    assert hook.phases == ["tokenize", "build", "layout", "print"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        runner = CliRunner(env={"BROWN_CACHE_DIR": str(root / "cache")})
+        for name in ["a", "b"]:
+            (root / f"{name}.sql").write_text(raw)
+        result = runner.invoke(main, [tmp, "--check", "--profile", "--workers", "2"])
+        assert "profile of 2 file(s)" in result.output and "tokens" in result.output
+        assert "slowest files:" in result.output and str(root / "a.sql") in result.output
+
+
+def test_daemon() -> None:
+    class UnixConnection(http.client.HTTPConnection):
+        def connect(self):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(self.host)
+
+    def post(connection, body, **headers):
+        connection.request("POST", "/", body=body.encode(), headers=headers)
+        response = connection.getresponse()
+        return response.status, response.read().decode()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for server, connect in [
+            (make_server(port=0), lambda x: http.client.HTTPConnection("localhost", x.server_port)),
+            (make_server(socket=f"{tmp}/brownd.sock"), lambda x: UnixConnection(x.server_address)),
+        ]:
+            format_text.cache_clear()
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                connection = connect(server)
+                assert post(connection, "select a from t") == (200, "SELECT a\nFROM t\n")
+                assert post(connection, "SELECT a\nFROM t\n") == (204, "")
+                status, error = post(connection, "select (a from t")
+                assert status == 400 and "Unbounded group" in error
+                assert post(connection, "select a, b from t", **{"X-Line-Length": "10"}) == (
+                    200,
+                    "SELECT\n    a,\n    b\nFROM t\n",
+                )
+                # saving the same buffer again is served from memory
+                assert post(connection, "select a from t") == (200, "SELECT a\nFROM t\n")
+                assert format_text.cache_info().hits == 1
+                connection.close()
+            finally:
+                server.shutdown()
+                server.server_close()
+        # a socket left over from before gets replaced, but nothing else does
+        make_server(socket=f"{tmp}/brownd.sock").server_close()
+        precious = Path(tmp) / "precious.txt"
+        precious.write_text("data")
+        with pytest.raises(FileExistsError, match="isn't a socket"):
+            make_server(socket=str(precious))
+        assert precious.read_text() == "data"
+
+
+def test_check_diff() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        runner = CliRunner(env={"BROWN_CACHE_DIR": str(root / "cache")})
+        (root / "a.sql").write_text("select a from t\n")
+        (root / "b.sql").write_text("SELECT b\nFROM t\n")
+        result = runner.invoke(main, [str(root), "--check"])
+        assert result.exit_code == 1
+        assert f"would reformat {root / 'a.sql'}" in result.output
+        assert "1 file(s) would be changed, 1 unchanged, 0 failed." in result.output
+        result = runner.invoke(main, [str(root), "--diff"])
+        assert result.exit_code == 0
+        assert "-select a from t\n+SELECT a\n+FROM t\n" in result.output
+        assert (root / "a.sql").read_text() == "select a from t\n"
+        # files that are already formatted don't get written
+        mtime = (root / "b.sql").stat().st_mtime_ns
+        result = runner.invoke(main, [str(root), "--workers", "1"])
+        assert "1 file(s) changed, 1 unchanged, 0 failed." in result.output
+        assert (root / "b.sql").stat().st_mtime_ns == mtime
+        result = runner.invoke(main, [str(root), "--check"])
+        assert result.exit_code == 0
+
+
+def test_cache() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        runner = CliRunner(env={"BROWN_CACHE_DIR": str(root / "cache")})
+        (root / "a.sql").write_text("select a from t")
+        runner.invoke(main, [str(root / "a.sql")])
+        assert len(list((root / "cache").glob("cache-*.json"))) == 1
+        # anything the cache says is formatted doesn't get parsed again
+        with unittest.mock.patch(f"{parse.__module__}.parse") as mock_parse:
+            result = runner.invoke(main, [str(root / "a.sql")])
+            assert "0 file(s) changed, 1 unchanged, 0 failed." in result.output
+            assert not mock_parse.called
+        # different options get their own cache
+        runner.invoke(main, [str(root / "a.sql"), "--line-length", "80"])
+        assert len(list((root / "cache").glob("cache-*.json"))) == 2
+        # a change to the formatter starts over (and clears out the old caches)
+        cache = sys.modules[get_cache_prefix.__module__]
+        with unittest.mock.patch.object(cache, "get_formatter_digest", return_value="changed"):
+            with unittest.mock.patch(f"{parse.__module__}.parse") as mock_parse:
+                runner.invoke(main, [str(root / "a.sql")])
+                assert mock_parse.called
+            names = [x.name for x in (root / "cache").glob("cache-*.json")]
+            assert len(names) == 1 and names[0].startswith(get_cache_prefix(__version__))
+        (root / "a.sql").write_text("select b from t")
+        result = runner.invoke(main, [str(root / "a.sql")])
+        assert "1 file(s) changed, 0 unchanged, 0 failed." in result.output
+
 
 #     raw = """SELECT *,
 #     CASE
@@ -374,9 +1254,29 @@ WHERE h AND k > 10
 if __name__ == "__main__":
     debug: bool = True
     test_scan_to_close(debug=debug)
+    test_tokenize()
+    test_process_select()
+    test_subquery()
+    test_expression_cache()
+    test_layout()
+    test_build_statement()
+    test_match_clause_keyword()
     test_detect_substatement_type()
     test_indent_case_statement(debug=debug)
     test_indent_case_statement_iterative(debug=debug)
     # test_get_trailing_comment()
     test_process_expression()
     test_parse(debug=debug)
+    test_format_stream()
+    test_split_statements()
+    test_format_stream_parallel()
+    test_trace()
+    test_import_time()
+    test_scaling()
+    test_main()
+    test_format_str()
+    test_verify_formatted()
+    test_profile()
+    test_daemon()
+    test_check_diff()
+    test_cache()